@@ -0,0 +1,235 @@
+"""
+Бенчмарк конвейера генерации: задержка generate_document, пиковая память и пропускная способность
+для одиночного рендера, пакета в одном процессе и пакета в пуле процессов (core.parallel).
+
+Шаблоны синтезируются заново при каждом запуске (абзацы, таблицы, шапки/подвалы, плейсхолдеры,
+картинки), так что результаты воспроизводимы между коммитами. Каждый сценарий идёт в отдельном
+процессе: пиковая память (ru_maxrss) относится только к нему. Результат — JSON.
+
+    python -m benchmarks.pipeline [--profiles small,medium] [--paths single,batch,parallel]
+                                  [--engine docx|xml] [--workers N] [--output results.json]
+
+БД не нужна: файлы пишутся во временный MEDIA_ROOT, пул процессов поднимается без предзагрузки
+шаблонов из таблицы Template.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from docx import Document
+from docx.shared import Inches
+
+PROFILES = {
+    #        абзацы, таблицы, строк x колонок, разделы (шапка+подвал), плейсхолдеры, картинки, px
+    "small": dict(paragraphs=20, tables=1, rows=5, cols=3, sections=1, placeholders=10, images=0, image_px=(0, 0)),
+    "medium": dict(paragraphs=200, tables=5, rows=10, cols=4, sections=2, placeholders=50, images=2, image_px=(400, 300)),
+    "large": dict(paragraphs=2000, tables=20, rows=20, cols=5, sections=4, placeholders=200, images=5, image_px=(800, 600)),
+    "images": dict(paragraphs=50, tables=0, rows=0, cols=0, sections=1, placeholders=10, images=10, image_px=(1024, 768)),
+}
+PATHS = ("single", "batch", "parallel")
+
+
+def _png(width: int, height: int, seed: int) -> bytes:
+    """RGB PNG из шума: почти не сжимается, по размеру похож на фотографию."""
+    rnd = random.Random(seed)
+    raw = b"".join(b"\x00" + rnd.randbytes(width * 3) for _ in range(height))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b"")
+
+
+def build_template(path: Path, paragraphs: int, tables: int, rows: int, cols: int, sections: int,
+                   placeholders: int, images: int, image_px: tuple[int, int]) -> dict:
+    """Пишет шаблон в path и возвращает значения для рендера (каждый десятый ключ пропущен — подставится "—")."""
+    keys = [f"KEY_{n}" for n in range(placeholders)]
+    token = lambda i: "{%s}" % keys[i % placeholders]  # noqa: E731
+    doc = Document()
+
+    per_section = max(1, paragraphs // sections)
+    tables_left, images_left = tables, images
+    for s in range(sections):
+        section = doc.sections[0] if s == 0 else doc.add_section()
+        section.header.is_linked_to_previous = False
+        section.footer.is_linked_to_previous = False
+        section.header.paragraphs[0].text = f"Шапка раздела {s + 1}: {token(s)}"
+        section.footer.paragraphs[0].text = f"Подвал {token(s + 1)}, стр. {s + 1}"
+        for i in range(per_section):
+            n = s * per_section + i
+            if n % 3 == 2:
+                doc.add_paragraph(f"Абзац {n} без подстановок: обычный текст договора.")
+            else:
+                p = doc.add_paragraph(f"Абзац {n}: {token(n)} и {token(n + 7)}, далее ")
+                p.add_run(token(n + 13)).bold = True
+        for _ in range(-(-tables_left // (sections - s))):
+            table = doc.add_table(rows=rows, cols=cols)
+            for r, row in enumerate(table.rows):
+                for c, cell in enumerate(row.cells):
+                    # Половина ячеек с плейсхолдерами
+                    cell.text = token(r * cols + c) if (r + c) % 2 == 0 else f"Ячейка {r}.{c}"
+            tables_left -= 1
+        for _ in range(-(-images_left // (sections - s))):
+            doc.add_picture(BytesIO(_png(*image_px, seed=images_left)), width=Inches(3))
+            images_left -= 1
+
+    doc.save(path)
+    return {key: f"Значение {n}" for n, key in enumerate(keys) if n % 10 != 9}
+
+
+def _percentiles(samples: list[float]) -> dict:
+    ms = sorted(s * 1000 for s in samples)
+    if len(ms) == 1:
+        cuts = ms * 99
+    else:
+        cuts = statistics.quantiles(ms, n=100, method="inclusive")
+    return {
+        "min": round(ms[0], 3), "p50": round(cuts[49], 3), "p90": round(cuts[89], 3),
+        "p95": round(cuts[94], 3), "p99": round(cuts[98], 3), "max": round(ms[-1], 3),
+        "mean": round(statistics.fmean(ms), 3),
+    }
+
+
+def _clean(directory: Path):
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def _run_scenario(template_path: str, values: dict, path: str, media_root: str, engine: str,
+                  iterations: int, batch_size: int, repeat: int, workers: int) -> dict:
+    """Выполняется в отдельном процессе (spawn): настраивает Django и меряет один сценарий."""
+    os.environ.update(
+        DJANGO_SETTINGS_MODULE="docxgen.settings", MEDIA_ROOT=media_root, DOCXGEN_RENDER_ENGINE=engine,
+        DOCXGEN_RENDER_WORKERS=str(workers if path == "parallel" else 0),
+    )
+    import django
+
+    django.setup()
+    from core import parallel
+    from core.utils import generate_document
+
+    generated = Path(media_root) / "generated"
+    started = time.perf_counter()
+    generate_document(template_path, values)  # холодный: разбор шаблона и заполнение кэша
+    cold = time.perf_counter() - started
+
+    result = {"cold_ms": round(cold * 1000, 3)}
+    if path == "single":
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            generate_document(template_path, values)
+            samples.append(time.perf_counter() - started)
+        total = sum(samples)
+        result.update(documents=iterations, latency_ms=_percentiles(samples),
+                      throughput_docs_s=round(iterations / total, 2))
+    else:
+        if path == "parallel":
+            # Пул с предзагрузкой только этого шаблона — get_executor() взял бы список из БД
+            parallel._executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=parallel._init_worker, initargs=((template_path,),),
+            )
+            parallel.render_many(template_path, [values] * workers * 2)  # прогрев процессов
+        values_list = [values] * batch_size
+        samples = []
+        for _ in range(repeat):
+            _clean(generated)
+            started = time.perf_counter()
+            parallel.render_many(template_path, values_list)
+            samples.append(time.perf_counter() - started)
+        total = sum(samples)
+        result.update(documents=batch_size * repeat, workers=workers if path == "parallel" else 1,
+                      batch_ms=_percentiles(samples),
+                      per_document_ms=round(total / (batch_size * repeat) * 1000, 3),
+                      throughput_docs_s=round(batch_size * repeat / total, 2))
+        parallel.shutdown_executor()
+
+    _clean(generated)
+    # ru_maxrss в Linux — КиБ; RUSAGE_CHILDREN — максимум среди завершившихся процессов пула
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    if path == "parallel":
+        result["worker_peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+    return result
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profiles", default="small,medium,large,images", help=f"Из {', '.join(PROFILES)}")
+    parser.add_argument("--paths", default=",".join(PATHS), help=f"Из {', '.join(PATHS)}")
+    parser.add_argument("--engine", choices=("docx", "xml"), default="docx")
+    parser.add_argument("--iterations", type=int, default=50, help="Рендеров в сценарии single")
+    parser.add_argument("--batch-size", type=int, default=100, help="Документов в пакете (batch/parallel)")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов пакета")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Процессов для parallel")
+    parser.add_argument("--output", help="Файл для JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    profiles = [p for p in args.profiles.split(",") if p]
+    paths = [p for p in args.paths.split(",") if p]
+    unknown = [p for p in profiles if p not in PROFILES] + [p for p in paths if p not in PATHS]
+    if unknown:
+        parser.error(f"Неизвестно: {', '.join(unknown)}")
+
+    workdir = Path(tempfile.mkdtemp(prefix="docxgen-bench-"))
+    report = {
+        "meta": {
+            "commit": _git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "engine": args.engine, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "iterations": args.iterations, "batch_size": args.batch_size, "repeat": args.repeat,
+        },
+        "results": [],
+    }
+    try:
+        for name in profiles:
+            template_path = workdir / f"{name}.docx"
+            values = build_template(template_path, **PROFILES[name])
+            for path in paths:
+                # Новый процесс на сценарий — пиковая память не накапливается между сценариями
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as runner:
+                    result = runner.submit(
+                        _run_scenario, str(template_path), values, path, str(workdir / "media"), args.engine,
+                        args.iterations, args.batch_size, args.repeat, args.workers,
+                    ).result()
+                entry = {
+                    "profile": name, "path": path,
+                    "template": {**PROFILES[name], "size_bytes": template_path.stat().st_size}, **result,
+                }
+                report["results"].append(entry)
+                print(f"{name:>7} {path:>8}: {result['throughput_docs_s']:>8} док/с, "
+                      f"пик {result['peak_rss_mb']} МБ", file=sys.stderr)
+    finally:
+        _clean(workdir)
+
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(payload + "\n", encoding="utf-8")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Микро-бенчмарк подстановки: как время замены растёт с числом разных плейсхолдеров.
+
+Сравнивает прежний алгоритм (цикл text.replace по всем токенам для каждого абзаца)
+с однопроходным core.utils._replace_in_paragraphs, а также сколько runs каждый из них
+пересоздаёт и сохраняется ли форматирование (часть токенов разбита на жирные runs).
+
+    python -m benchmarks.replace_scaling [--paragraphs 500] [--repeat 5]
+"""
+import argparse
+import os
+import time
+
+from docx import Document
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "docxgen.settings")
+
+from core.utils import TOKEN_RE, _norm, _replace_in_paragraphs  # noqa: E402
+
+
+def _legacy_replace(paragraphs, values_norm: dict[str, str], default_placeholder: str):
+    """Алгоритм до однопроходной замены: O(абзацы × токены) и p.text = ... для каждого абзаца."""
+    paragraphs = [Paragraph(p, None) for p in paragraphs]
+    tokens = set()
+    for p in paragraphs:
+        tokens |= {m.group(0) for m in TOKEN_RE.finditer(p.text or "")}
+    mapping_exact = {t: values_norm.get(_norm(t[1:-1]), default_placeholder) for t in tokens}
+    for p in paragraphs:
+        text = p.text or ""
+        if not text:
+            continue
+        for token, value in mapping_exact.items():
+            if token in text:
+                text = text.replace(token, value)
+        p.text = text
+
+
+def _build(paragraph_count: int, placeholder_count: int):
+    """
+    Документ, где в каждом абзаце 3 плейсхолдера из пула, а каждый второй — без токенов.
+    Последний токен абзаца разбит на два жирных run, как это делает Word при правке.
+    """
+    doc = Document()
+    for i in range(paragraph_count):
+        if i % 2:
+            doc.add_paragraph(f"Обычный текст без подстановок, абзац {i}.")
+            continue
+        keys = [f"KEY_{(i + j) % placeholder_count}" for j in range(3)]
+        p = doc.add_paragraph("Поле {%s}, поле { %s }, поле " % tuple(keys[:2]))
+        p.add_run("{" + keys[2][:3]).bold = True
+        p.add_run(keys[2][3:] + "}").bold = True
+        p.add_run(".")
+    values = {_norm(f"KEY_{n}"): f"значение {n}" for n in range(placeholder_count)}
+    return doc, values
+
+
+def _paragraphs(doc) -> list:
+    return list(doc.element.body.iter(qn("w:p")))
+
+
+def _measure(fn, paragraph_count: int, placeholder_count: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        doc, values = _build(paragraph_count, placeholder_count)
+        started = time.perf_counter()
+        fn(_paragraphs(doc), values, "—")
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _run_report(fn, paragraph_count: int) -> tuple[int, int]:
+    """(сколько w:r создано заново, сколько жирных w:r осталось) после замены."""
+    doc, values = _build(paragraph_count, 100)
+    body = doc.element.body
+    for r in body.iter(qn("w:r")):
+        r.set("marker", "1")  # помечаем исходные runs, чтобы отличить новые
+    fn(_paragraphs(doc), values, "—")
+    created = sum(1 for r in body.iter(qn("w:r")) if r.get("marker") is None)
+    bold = len(body.xpath(".//w:r[w:rPr/w:b]"))
+    return created, bold
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--paragraphs", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'плейсхолдеров':>14} {'прежний, мс':>12} {'однопроходный, мс':>18} {'ускорение':>10}")
+    for placeholder_count in (10, 50, 100, 250, 500, 1000):
+        legacy = _measure(_legacy_replace, args.paragraphs, placeholder_count, args.repeat)
+        single = _measure(_replace_in_paragraphs, args.paragraphs, placeholder_count, args.repeat)
+        print(f"{placeholder_count:>14} {legacy * 1000:>12.1f} {single * 1000:>18.1f} {legacy / single:>9.1f}x")
+
+    print()
+    for name, fn in (("прежний", _legacy_replace), ("однопроходный", _replace_in_paragraphs)):
+        created, bold = _run_report(fn, args.paragraphs)
+        print(f"{name:>14}: создано runs {created}, жирных runs осталось {bold}")
+
+
+if __name__ == "__main__":
+    main()
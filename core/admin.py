@@ -1,12 +1,13 @@
 from django.contrib import admin
 from django import forms
-from .models import Entity, Client, Template, GeneratedDocument
+from .models import Entity, Client, Template, GeneratedDocument, GenerationJob, RenderCacheEntry
 
 
 class ClientAdminForm(forms.ModelForm):
     """
     Динамическая форма клиента: для каждого Entity создаёт отдельное поле
     (attr__<KEY>). Значения сохраняются в Client.attributes (JSON).
+    Списки и словари (данные блоков {#KEY}) поля не получают и сохраняются как были.
     """
     class Meta:
         model = Client
@@ -16,8 +17,11 @@ class ClientAdminForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         existing = dict(self.instance.attributes or {})
         self._entity_fields: list[tuple[str, str]] = []  # (field_name, key)
+        self._kept = {k: v for k, v in existing.items() if isinstance(v, (list, dict))}
 
         for e in Entity.objects.all().order_by("key"):
+            if e.key in self._kept:
+                continue
             field_name = f"attr__{e.key}"
             self._entity_fields.append((field_name, e.key))
             self.fields[field_name] = forms.CharField(
@@ -28,7 +32,7 @@ class ClientAdminForm(forms.ModelForm):
 
     def clean(self):
         cleaned = super().clean()
-        attrs = {}
+        attrs = dict(getattr(self, "_kept", {}))
         for field_name, key in getattr(self, "_entity_fields", []):
             attrs[key] = self.cleaned_data.get(field_name, "") or ""
         # сохраняем подготовленный словарь для save()
@@ -82,3 +86,16 @@ class GeneratedDocumentAdmin(admin.ModelAdmin):
     list_display = ("client", "template", "file", "created_at")
     list_filter = ("client", "template")
     search_fields = ("client__name", "template__name")
+
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "template", "status", "done", "total", "created_at", "finished_at")
+    list_filter = ("status", "template")
+    readonly_fields = ("client_ids", "documents", "worker", "started_at", "heartbeat_at", "finished_at", "error")
+
+
+@admin.register(RenderCacheEntry)
+class RenderCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ("key", "template", "file", "hits", "created_at", "last_hit_at")
+    list_filter = ("template",)
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
-    verbose_name = "Документы"
\ No newline at end of file
+    verbose_name = "Документы"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,70 @@
+"""
+Потоковая сборка ZIP: архив отдаётся кусками по мере чтения файлов,
+без временного файла и без сжатия (.docx уже сжат внутри).
+"""
+import zipfile
+from collections.abc import Iterable, Iterator
+
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+_CHUNK = 64 * 1024
+
+
+class _StreamBuffer:
+    """Несикаемый «файл» для zipfile: накапливает записанное до следующего pop()."""
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._pos = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(entries: Iterable[tuple[str, str]]) -> Iterator[bytes]:
+    """entries: пары (имя в архиве, путь к файлу). Отдаёт байты ZIP (метод STORED)."""
+    buf = _StreamBuffer()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for arcname, path in entries:
+            try:
+                info = zipfile.ZipInfo.from_file(path, arcname)
+            except FileNotFoundError:
+                continue  # файл потерян — не обрываем уже начатую отдачу архива
+            info.compress_type = zipfile.ZIP_STORED
+            with open(path, "rb") as src, zf.open(info, "w") as dst:
+                while chunk := src.read(_CHUNK):
+                    dst.write(chunk)
+                    yield buf.pop()
+            yield buf.pop()
+    yield buf.pop()
+
+
+def named_entries(items: Iterable[tuple[str, str]], suffix: str = ".docx") -> Iterator[tuple[str, str]]:
+    """
+    (имя клиента, путь) -> (уникальное имя в архиве, путь):
+    'Иванов', 'Иванов' -> 'Иванов.docx', 'Иванов (2).docx'; '/' в именах заменяется.
+    """
+    seen: dict[str, int] = {}
+    for name, path in items:
+        base = (name or "document").replace("/", "_").replace("\\", "_")
+        count = seen[base] = seen.get(base, 0) + 1
+        yield (f"{base}{suffix}" if count == 1 else f"{base} ({count}){suffix}"), path
+
+
+def zip_response(entries: Iterable[tuple[str, str]], filename: str) -> StreamingHttpResponse:
+    response = StreamingHttpResponse(iter_zip(entries), content_type="application/zip")
+    response["Content-Disposition"] = content_disposition_header(as_attachment=True, filename=filename)
+    return response
@@ -0,0 +1,258 @@
+"""
+Повторяющиеся и условные блоки в шаблонах:
+
+    {#ITEMS} ... {/ITEMS} — блок для каждого элемента списка ITEMS; непустое значение-не список —
+                            блок один раз, пустое или отсутствующее — блок удаляется;
+    {^KEY} ... {/KEY}     — блок, только если KEY пустой или отсутствует.
+
+— Внутри повтора ключи элемента-словаря ({NAME}, {PRICE}) перекрывают атрибуты клиента,
+  элемент-строка доступен как {.}. Блоки могут быть вложенными.
+— Маркеры в одной строке таблицы или в разных строках одной таблицы — повторяются строки целиком;
+  иначе — соседние элементы (абзацы, таблицы) от абзаца с открывающим маркером до абзаца с закрывающим.
+  Абзац или строка таблицы, где кроме маркеров ничего нет, в результат не попадает.
+  Блоки внутри одного абзаца не поддерживаются: такие маркеры остаются в тексте как есть.
+— При компиляции шаблона диапазон блока вырезается в прототип, а на его место ставится якорь
+  (XML-комментарий). Рендер только клонирует прототип нужное число раз — без повторного разбора,
+  линейно по числу элементов.
+— Рисунки и закладки в копиях получают новые id; ячейка таблицы, шапка или подвал, оставшиеся
+  после пустого блока без абзаца, получают пустой абзац — иначе Word считает файл повреждённым.
+"""
+import copy
+import logging
+from collections import ChainMap
+from collections.abc import Iterator
+
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+from lxml import etree
+
+from .utils import (
+    TOKEN_RE, _BLOCK_SIGILS, _BOOKMARKS, _DOC_PR,
+    _as_text, _element_path, _norm, _renumber, _replace_in_paragraphs, _replace_in_runs, _resolve_path,
+)
+
+logger = logging.getLogger(__name__)
+
+_ROW = qn("w:tr")
+_PARAGRAPH = qn("w:p")
+_SECTION = qn("w:sectPr")
+# Контейнеры, которые обязаны заканчиваться абзацем
+_CONTAINERS = (qn("w:tc"), qn("w:hdr"), qn("w:ftr"), qn("w:txbxContent"))
+
+
+class Block:
+    """
+    Прототип блока:
+    — elements: вырезанные элементы (не изменяются, рендер работает с копиями);
+    — slots: пути абзацев с плейсхолдерами — (индекс в elements, индексы детей ...);
+    — anchors: [(путь, Block)] — якоря вложенных блоков;
+    — renumber: есть ли в elements рисунки или закладки, которым в копиях нужны новые id.
+    """
+    def __init__(self, key: str, inverted: bool):
+        self.key = key
+        self.inverted = inverted
+        self.elements: list = []
+        self.slots: list[tuple[int, ...]] = []
+        self.anchors: list[tuple[tuple[int, ...], "Block"]] = []
+        self.renumber = False
+
+    def scopes(self, raw, text) -> Iterator[tuple]:
+        """
+        Области видимости для каждого повтора блока: пары (сырые значения, строки),
+        оба словаря — с нормализованными ключами.
+        """
+        value = raw.get(self.key)
+        filled = value not in (None, "", [], {})
+        if self.inverted or not filled:
+            if self.inverted and not filled:
+                yield raw, text
+            return
+        for item in (value if isinstance(value, list) else [value]):
+            if isinstance(item, dict):
+                item_raw = {_norm(k): v for k, v in item.items()}
+                yield ChainMap(item_raw, raw), ChainMap({k: _as_text(v) for k, v in item_raw.items()}, text)
+            elif isinstance(value, list):
+                yield ChainMap({".": item}, raw), ChainMap({".": _as_text(item)}, text)
+            else:
+                yield raw, text
+
+
+class _Pair:
+    def __init__(self, key: str, inverted: bool, open_p, open_token: str, close_p, close_token: str):
+        self.block = Block(key, inverted)
+        self.open_p, self.open_token = open_p, open_token
+        self.close_p, self.close_token = close_p, close_token
+        self.parent = self.first = self.last = None
+        self.edges = ()  # исходные first и last — до того, как вложенные блоки заменили их якорями
+
+
+def _markers(p) -> list[tuple[str, str, str]]:
+    """[(токен, знак, ключ)] маркеров блоков в абзаце."""
+    found = []
+    for m in TOKEN_RE.finditer(p.text or ""):
+        key = _norm(m.group(1))
+        if key[:1] in _BLOCK_SIGILS and len(key) > 1:
+            found.append((m.group(0), key[0], key[1:]))
+    return found
+
+
+def _pairs(root) -> list[_Pair]:
+    """Пары маркеров в порядке закрытия: вложенные блоки раньше внешних."""
+    pairs, stack = [], []
+    for p in root.iter(_PARAGRAPH):
+        for token, sigil, key in _markers(p):
+            if sigil != "/":
+                stack.append((sigil, key, p, token))
+            elif stack and stack[-1][1] == key:
+                sigil, _, open_p, open_token = stack.pop()
+                pairs.append(_Pair(key, sigil == "^", open_p, open_token, p, token))
+            else:
+                logger.warning("Закрывающий маркер %s без открывающего — оставлен как текст", token)
+    for sigil, key, _, _ in stack:
+        logger.warning("Маркер {%s%s} без закрывающего {/%s} — оставлен как текст", sigil, key, key)
+    return pairs
+
+
+def _range(pair: _Pair) -> bool:
+    """Находит общего родителя и крайние элементы блока; False — блок внутри одного абзаца."""
+    ancestors = {}
+    el = pair.open_p
+    child = None
+    while el is not None:
+        ancestors[el] = child
+        child, el = el, el.getparent()
+
+    last, el = None, pair.close_p
+    while el not in ancestors:
+        last, el = el, el.getparent()
+    parent, first = el, ancestors[el]
+    if parent.tag == _PARAGRAPH or first is None or last is None or parent in (pair.open_p, pair.close_p):
+        return False
+    if parent.tag == _ROW:
+        # Маркеры в разных ячейках одной строки — повторяется строка
+        parent, first, last = parent.getparent(), parent, parent
+    pair.parent, pair.first, pair.last = parent, first, last
+    pair.edges = (first, last)
+    return True
+
+
+def _marker_only(el, stripped: dict) -> bool:
+    """В абзаце (или строке таблицы) нет ничего, кроме маркеров блоков, и нет разрыва раздела."""
+    for p in el.iter(_PARAGRAPH):
+        tokens = stripped.get(p, ())
+        if TOKEN_RE.sub(lambda m: "" if m.group(0) in tokens else m.group(0), p.text or "").strip():
+            return False
+    return next(el.iter(_SECTION), None) is None
+
+
+def _strip(p, tokens: set[str]):
+    resolve = lambda m: "" if m.group(0) in tokens else m.group(0)  # noqa: E731
+    if not _replace_in_runs(p, resolve):
+        Paragraph(p, None).text = TOKEN_RE.sub(resolve, p.text or "")
+
+
+def _locate(elements: list, anchors: dict) -> tuple[list, list]:
+    """Слоты и якоря вложенных блоков внутри прототипа; пути начинаются с индекса в elements."""
+    slots, nested = [], []
+    for i, element in enumerate(elements):
+        index_cache: dict = {}
+        for el in element.iter(_PARAGRAPH, etree.Comment):
+            if el.tag is etree.Comment:
+                if el in anchors:
+                    nested.append(((i,) + _element_path(element, el, index_cache), anchors[el]))
+                continue
+            if TOKEN_RE.search(el.text or ""):
+                slots.append((i,) + _element_path(element, el, index_cache))
+    return slots, nested
+
+
+def compile_blocks(partname: str, root) -> list[tuple[str, tuple[int, ...], Block]]:
+    """
+    Вырезает блоки из части (root изменяется!) и возвращает якоря верхнего уровня:
+    [(partname, путь, Block)]. Вызывать до поиска слотов (_scan_part): абзацы блоков
+    к этому моменту уже в прототипах, и в слоты части не попадут.
+    """
+    pairs = [pair for pair in _pairs(root) if _range(pair)]
+    if not pairs:
+        return []
+
+    # Маркеры убираются из текста до вырезания; крайние абзацы и строки таблиц, где кроме
+    # маркеров ничего нет, запоминаются заранее — в прототип блока они не попадут
+    stripped: dict = {}
+    for pair in pairs:
+        stripped.setdefault(pair.open_p, set()).add(pair.open_token)
+        stripped.setdefault(pair.close_p, set()).add(pair.close_token)
+    marker_only = {el: _marker_only(el, stripped) for pair in pairs for el in pair.edges}
+    for p, tokens in stripped.items():
+        _strip(p, tokens)
+
+    anchors: dict = {}
+    for n, pair in enumerate(pairs):
+        block = pair.block
+        elements, el = [], pair.first
+        while True:
+            elements.append(el)
+            if el is pair.last:
+                break
+            el = el.getnext()
+        anchor = etree.Comment(f" docxgen-block {block.key} ")
+        pair.first.addprevious(anchor)
+        for el in elements:
+            pair.parent.remove(el)
+        # Внешние блоки, чья граница попала внутрь этого, теперь начинаются/кончаются якорем
+        inside = set(elements)
+        for outer in pairs[n + 1:]:
+            if outer.first in inside:
+                outer.first = anchor
+            if outer.last in inside:
+                outer.last = anchor
+        first, last = pair.edges
+        if elements and elements[0] is first and marker_only[first]:
+            elements.pop(0)
+        if elements and elements[-1] is last and marker_only[last]:
+            elements.pop()
+        block.elements = elements
+        anchors[anchor] = block
+
+    for block in anchors.values():
+        block.slots, block.anchors = _locate(block.elements, anchors)
+        block.renumber = any(True for el in block.elements for _ in el.iter(_DOC_PR, *_BOOKMARKS))
+    index_cache: dict = {}
+    return [
+        (partname, _element_path(root, el, index_cache), anchors[el])
+        for el in root.iter(etree.Comment) if el in anchors
+    ]
+
+
+def _expand(anchor, block: Block, raw, text, default_placeholder: str, ids: Iterator[int]):
+    for item_raw, item_text in block.scopes(raw, text):
+        clones = [copy.deepcopy(el) for el in block.elements]
+        paragraphs = [_resolve_path(clones[path[0]], path[1:]) for path in block.slots]
+        nested = [(_resolve_path(clones[path[0]], path[1:]), child) for path, child in block.anchors]
+        if block.renumber:
+            _renumber(clones, ids)
+        for clone in clones:
+            anchor.addprevious(clone)
+        _replace_in_paragraphs(paragraphs, item_text, default_placeholder)
+        for child_anchor, child in nested:
+            _expand(child_anchor, child, item_raw, item_text, default_placeholder, ids)
+    parent = anchor.getparent()
+    parent.remove(anchor)
+    # Якорь ещё не развёрнутого соседнего блока — проверка будет, когда дойдёт до него
+    last = parent[-1] if len(parent) else None
+    if parent.tag in _CONTAINERS and (last is None or last.tag not in (_PARAGRAPH, etree.Comment)):
+        parent.append(OxmlElement("w:p"))
+
+
+def expand_blocks(anchors: list[tuple], values_dict: dict, default_placeholder: str, ids: Iterator[int]):
+    """
+    anchors: [(якорь в копии документа, Block)] — найдены по путям до любых правок документа.
+    ids — источник новых id рисунков и закладок в копиях (начиная с первого свободного в документе).
+    """
+    if not anchors:
+        return
+    raw = {_norm(k): v for k, v in (values_dict or {}).items()}
+    text = {k: _as_text(v) for k, v in raw.items()}
+    for anchor, block in anchors:
+        _expand(anchor, block, raw, text, default_placeholder, ids)
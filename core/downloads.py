@@ -0,0 +1,68 @@
+"""
+Отдача файлов из MEDIA_ROOT.
+
+При DOCXGEN_X_ACCEL_REDIRECT Django только проверяет доступ и ставит Content-Disposition,
+а байты отдаёт nginx из internal-локации (DOCXGEN_X_ACCEL_PREFIX, см. deploy/nginx.conf):
+медленный клиент не держит воркер приложения. Иначе — обычный FileResponse.
+buffer_response() — для документов, отрендеренных в память (без файла на диске).
+
+asynchronous=True — для async-view под ASGI: тело отдаётся асинхронным итератором, каждый кусок
+читается через sync_to_async (FileResponse с синхронным файлом Django под ASGI вычитал бы целиком).
+Сами функции синхронные (exists/open) — из async-view их вызывают через sync_to_async или из пула.
+"""
+import mimetypes
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+_CHUNK_SIZE = 64 * 1024
+
+
+def _content_type(filename: str) -> str:
+    content_type, _ = mimetypes.guess_type(filename)
+    return content_type or "application/octet-stream"
+
+
+async def _chunks(f):
+    read = sync_to_async(f.read, thread_sensitive=False)
+    try:
+        while chunk := await read(_CHUNK_SIZE):
+            yield chunk
+    finally:
+        f.close()
+
+
+def _async_file_response(f, filename: str, size: int) -> StreamingHttpResponse:
+    response = StreamingHttpResponse(_chunks(f), content_type=_content_type(filename))
+    response["Content-Length"] = str(size)
+    response["Content-Disposition"] = content_disposition_header(as_attachment=True, filename=filename)
+    return response
+
+
+def buffer_response(buffer, filename: str, asynchronous: bool = False):
+    """Отдаёт уже готовый поток (файл не из хранилища): X-Accel здесь неприменим."""
+    if asynchronous:
+        size = buffer.seek(0, 2)
+        buffer.seek(0)
+        return _async_file_response(buffer, filename, size)
+    return FileResponse(buffer, as_attachment=True, filename=filename)
+
+
+def download_response(file_name: str, filename: str, asynchronous: bool = False):
+    """file_name — имя файла в хранилище (FileField.name), filename — имя для пользователя."""
+    if not file_name or not default_storage.exists(file_name):
+        raise Http404("Файл не найден")
+    if not getattr(settings, "DOCXGEN_X_ACCEL_REDIRECT", False):
+        f = default_storage.open(file_name, "rb")
+        if asynchronous:
+            return _async_file_response(f, filename, f.size)
+        return FileResponse(f, as_attachment=True, filename=filename)
+
+    response = HttpResponse(content_type=_content_type(filename))
+    response["Content-Disposition"] = content_disposition_header(as_attachment=True, filename=filename)
+    response["X-Accel-Redirect"] = settings.DOCXGEN_X_ACCEL_PREFIX + quote(file_name, safe="/")
+    return response
@@ -1,11 +1,22 @@
 from django import forms
+from django.db import transaction
 from .models import Template, Client, Entity  # <-- без Value
+from .services import index_template
 
 class TemplateUploadForm(forms.ModelForm):
     class Meta:
         model = Template
         fields = ["name", "file"]
 
+    def save(self, commit=True):
+        if not commit:
+            return super().save(commit=False)
+        # Строка и индекс — в одной транзакции: неразобранный шаблон не остаётся в БД без индекса
+        with transaction.atomic():
+            instance = super().save()
+            index_template(instance)
+        return instance
+
 class GenerateForm(forms.Form):
     client = forms.ModelChoiceField(queryset=Client.objects.all(), label="Клиент")
     template = forms.ModelChoiceField(queryset=Template.objects.all(), label="Шаблон")
@@ -24,14 +35,19 @@ class EntityForm(forms.ModelForm):
 class ClientAttributesForm(forms.Form):
     """Динамическая форма атрибутов клиента: по всем Entity создаёт поле.
     Значения берём только из client.attributes (без модели Value).
+    Списки и словари (данные блоков {#KEY}) в текстовом поле не редактируются: поля для них нет,
+    при сохранении они остаются как были.
     """
     def __init__(self, *args, client: Client, **kwargs):
         super().__init__(*args, **kwargs)
         self.client = client
         self.entities = list(Entity.objects.all().order_by("key"))
         existing_json = dict(getattr(client, "attributes", {}) or {})
+        self.kept = {k: v for k, v in existing_json.items() if isinstance(v, (list, dict))}
 
         for ent in self.entities:
+            if ent.key in self.kept:
+                continue
             initial = existing_json.get(ent.key, "")
             widget = forms.Textarea(attrs={"rows": 2}) if len(str(initial)) > 120 else forms.TextInput()
             field = forms.CharField(
@@ -49,5 +65,5 @@ class ClientAttributesForm(forms.Form):
 
     def save(self):
         data = {k: (v or "") for k, v in self.cleaned_data.items()}
-        self.client.attributes = data
+        self.client.attributes = {**data, **self.kept}
         self.client.save(update_fields=["attributes"])
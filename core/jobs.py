@@ -0,0 +1,119 @@
+"""
+Очередь фоновой генерации на таблице GenerationJob — без внешнего брокера.
+
+Задание забирается атомарным UPDATE ... WHERE status='queued', поэтому несколько
+воркеров не возьмут одно и то же. Прогресс и heartbeat пишутся после каждой порции
+клиентов; задания, чей воркер пропал (heartbeat устарел), возвращаются в очередь.
+Аренда задания — пара (worker, started_at), выданная при захвате: прогресс и итог
+пишутся только при совпадающей аренде, так что воркер, чьё задание уже вернули в очередь
+и отдали другому, ничего не перезапишет. Прогресс и привязка документов — одна транзакция.
+Между заданиями воркер может запускать сборку мусора (DOCXGEN_GC_INTERVAL_SECONDS).
+"""
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Client, GenerationJob
+from .retention import run_gc
+from .services import generate_batch
+
+logger = logging.getLogger(__name__)
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_next_job(worker: str) -> GenerationJob | None:
+    while True:
+        job_id = (
+            GenerationJob.objects.filter(status=GenerationJob.Status.QUEUED)
+            .order_by("created_at", "pk").values_list("pk", flat=True).first()
+        )
+        if job_id is None:
+            return None
+        now = timezone.now()
+        claimed = GenerationJob.objects.filter(pk=job_id, status=GenerationJob.Status.QUEUED).update(
+            status=GenerationJob.Status.RUNNING, worker=worker, started_at=now, heartbeat_at=now,
+        )
+        if claimed:
+            return GenerationJob.objects.select_related("template").get(pk=job_id)
+        # задание перехватил другой воркер — берём следующее
+
+
+def requeue_stale_jobs() -> int:
+    """Возвращает в очередь задания, по которым воркер давно не отчитывался."""
+    timeout = getattr(settings, "DOCXGEN_JOB_STALE_SECONDS", 600)
+    return GenerationJob.objects.filter(
+        status=GenerationJob.Status.RUNNING,
+        heartbeat_at__lt=timezone.now() - timedelta(seconds=timeout),
+    ).update(status=GenerationJob.Status.QUEUED, worker="")
+
+
+class LeaseLost(Exception):
+    """Задание вернули в очередь (или забрал другой воркер), пока этот его выполнял."""
+
+
+def _leased(job: GenerationJob):
+    return GenerationJob.objects.filter(
+        pk=job.pk, status=GenerationJob.Status.RUNNING, worker=job.worker, started_at=job.started_at,
+    )
+
+
+def run_job(job: GenerationJob, chunk_size: int = 50):
+    """Рендерит клиентов порциями; уже готовые документы при повторном запуске не пересоздаются."""
+    try:
+        pending = job.client_ids[job.done:]
+        for start in range(0, len(pending), chunk_size):
+            ids = pending[start:start + chunk_size]
+            by_id = Client.objects.in_bulk(ids)
+            docs = generate_batch(job.template, [by_id[pk] for pk in ids if pk in by_id])
+            now = timezone.now()
+            with transaction.atomic():
+                if not _leased(job).update(done=job.done + len(ids), heartbeat_at=now):
+                    raise LeaseLost
+                job.documents.add(*docs)
+            job.done += len(ids)
+            job.heartbeat_at = now
+    except LeaseLost:
+        logger.warning("Задание генерации #%s вернули в очередь — воркер %s его бросает", job.pk, job.worker)
+        return
+    except Exception as exc:
+        logger.exception("Задание генерации #%s упало", job.pk)
+        job.status = GenerationJob.Status.FAILED
+        job.error = f"{type(exc).__name__}: {exc}"
+    else:
+        job.status = GenerationJob.Status.DONE
+    job.finished_at = timezone.now()
+    if not _leased(job).update(status=job.status, error=job.error, finished_at=job.finished_at):
+        logger.warning("Задание генерации #%s вернули в очередь — итог воркера %s не записан", job.pk, job.worker)
+
+
+def work(poll_interval: float = 2.0, once: bool = False, chunk_size: int = 50):
+    """Цикл воркера. once=True — обработать очередь и выйти."""
+    worker = worker_name()
+    gc_interval = getattr(settings, "DOCXGEN_GC_INTERVAL_SECONDS", 0)
+    last_gc = 0.0
+    while True:
+        close_old_connections()
+        requeue_stale_jobs()
+        if gc_interval > 0 and time.monotonic() - last_gc >= gc_interval:
+            last_gc = time.monotonic()
+            try:
+                run_gc()
+            except Exception:
+                logger.exception("Сборка мусора упала")
+        job = claim_next_job(worker)
+        if job is not None:
+            logger.info("Воркер %s взял задание #%s (%s клиентов)", worker, job.pk, job.total)
+            run_job(job, chunk_size=chunk_size)
+            continue
+        if once:
+            return
+        time.sleep(poll_interval)
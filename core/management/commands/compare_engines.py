@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Client, Template
+from core.xml_engine import compare_engines
+
+
+class Command(BaseCommand):
+    help = "Сверяет результат XML-движка с python-docx для шаблона (и, опционально, клиента)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("template_id", type=int)
+        parser.add_argument("--client", type=int, help="ID клиента, чьи атрибуты подставить")
+
+    def handle(self, *args, **options):
+        template = Template.objects.filter(pk=options["template_id"]).first()
+        if template is None:
+            raise CommandError("Шаблон не найден")
+        values = {}
+        if options["client"]:
+            client = Client.objects.filter(pk=options["client"]).first()
+            if client is None:
+                raise CommandError("Клиент не найден")
+            values = dict(client.attributes or {})
+
+        diffs = compare_engines(template.file.path, values)
+        for index, expected, actual in diffs:
+            self.stdout.write(f"#{index}\n  docx: {expected!r}\n  xml:  {actual!r}")
+        if diffs:
+            raise CommandError(f"Расхождений: {len(diffs)}")
+        self.stdout.write(self.style.SUCCESS("Результаты движков совпадают"))
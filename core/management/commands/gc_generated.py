@@ -0,0 +1,30 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from core.retention import run_gc
+
+
+class Command(BaseCommand):
+    help = "Сборка мусора в media/generated: политика хранения, строки без файлов, файлы без строк"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-age-days", type=float,
+                            help="Удалить документы старше N дней (по умолчанию DOCXGEN_RETENTION_DAYS)")
+        parser.add_argument("--keep-per-client", type=int,
+                            help="Оставить K последних документов на клиента (по умолчанию DOCXGEN_RETENTION_PER_CLIENT)")
+        parser.add_argument("--batch-size", type=int, default=500, help="Строк/файлов за один проход")
+        parser.add_argument("--dry-run", action="store_true", help="Только посчитать, ничего не удалять")
+
+    def handle(self, *args, **options):
+        max_age = options["max_age_days"]
+        report = run_gc(
+            max_age=timedelta(days=max_age) if max_age else None,
+            keep_per_client=options["keep_per_client"],
+            batch_size=max(1, options["batch_size"]),
+            dry_run=options["dry_run"],
+        )
+        prefix = "Пробный прогон, ничего не удалено. " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Готово. По возрасту: {report.expired}, сверх лимита: {report.over_limit}, "
+            f"строк без файла: {report.missing_rows}, файлов без строк: {report.orphan_files}, "
+            f"записей кэша: {report.cache_evicted}"
+        ))
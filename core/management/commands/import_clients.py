@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.importer import FORMATS, detect_format, import_clients
+
+
+class Command(BaseCommand):
+    help = "Импортирует клиентов и их атрибуты из CSV или JSONL (создаёт новых, обновляет существующих)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к файлу .csv или .jsonl")
+        parser.add_argument("--format", choices=FORMATS, help="Формат файла, если не ясен из расширения")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Строк на одну транзакцию")
+        parser.add_argument("--replace", action="store_true", help="Заменять атрибуты целиком, а не дописывать")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or detect_format(options["path"])
+        if fmt is None:
+            raise CommandError(f"Не удалось определить формат, укажите --format ({', '.join(FORMATS)})")
+        try:
+            with open(options["path"], "rb") as f:
+                report = import_clients(f, fmt, chunk_size=max(1, options["chunk_size"]), replace=options["replace"])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+        for error in report.errors:
+            self.stderr.write(f"Строка {error['line']}: {error['error']}")
+        if report.failed > len(report.errors):
+            self.stderr.write(f"... и ещё {report.failed - len(report.errors)} ошибок")
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово. Создано: {report.created}, обновлено: {report.updated}, ошибок: {report.failed}"
+        ))
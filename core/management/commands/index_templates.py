@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from core.models import Template
+from core.services import index_template
+
+
+class Command(BaseCommand):
+    help = "Заполняет индекс плейсхолдеров, хеш и размер для уже загруженных шаблонов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Переиндексировать все, а не только без хеша")
+
+    def handle(self, *args, **options):
+        templates = Template.objects.all() if options["all"] else Template.objects.filter(content_hash="")
+        indexed = failed = 0
+        for template in templates.iterator():
+            try:
+                index_template(template)
+                indexed += 1
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f"{template.pk} {template.name}: {exc}")
+        self.stdout.write(self.style.SUCCESS(f"Готово. Проиндексировано: {indexed}, ошибок: {failed}"))
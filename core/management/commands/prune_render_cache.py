@@ -0,0 +1,15 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from core.render_cache import evict_unreferenced
+
+
+class Command(BaseCommand):
+    help = "Удаляет записи кэша рендера (и файлы), на которые не ссылается ни один документ"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=float, default=1.0,
+                            help="Не трогать записи, к которым обращались позже (по умолчанию 1 день)")
+
+    def handle(self, *args, **options):
+        removed = evict_unreferenced(older_than=timedelta(days=options["older_than_days"]))
+        self.stdout.write(self.style.SUCCESS(f"Готово. Удалено записей кэша: {removed}"))
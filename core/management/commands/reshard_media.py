@@ -0,0 +1,77 @@
+import os
+import shutil
+from datetime import date
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, CharField, F, Value, When
+
+from core.models import GeneratedDocument, RenderCacheEntry, Template
+from core.storage import GENERATED_DIR, TEMPLATES_DIR, layout, media_path, shard_name
+
+
+class Command(BaseCommand):
+    help = "Переносит файлы в раскладку DOCXGEN_STORAGE_LAYOUT и обновляет имена в БД"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Файлов на одну транзакцию")
+        parser.add_argument("--dry-run", action="store_true", help="Только посчитать, ничего не переносить")
+
+    def handle(self, *args, **options):
+        self.batch_size = max(1, options["batch_size"])
+        self.dry_run = options["dry_run"]
+        generated = (GeneratedDocument, RenderCacheEntry)
+        moved = sum(self._reshard(source, generated, GENERATED_DIR) for source in generated)
+        moved += self._reshard(Template, (Template,), TEMPLATES_DIR)
+        prefix = "Пробный прогон, ничего не перенесено. " if self.dry_run else ""
+        self.stdout.write(self.style.SUCCESS(f"{prefix}Готово ({layout()}). Перенесено файлов: {moved}"))
+
+    def _target(self, name: str, directory: str) -> str | None:
+        path = media_path(name)
+        if not path.exists():
+            return None  # строки без файла — забота gc_generated
+        target = shard_name(directory, name, on=date.fromtimestamp(path.stat().st_mtime))
+        return None if target == name else target
+
+    def _reshard(self, source, models, directory: str) -> int:
+        """Обход source по pk порциями; один файл может быть у нескольких строк всех models."""
+        moved, last_pk = 0, 0
+        while True:
+            batch = list(source.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", "file")[:self.batch_size])
+            if not batch:
+                return moved
+            last_pk = batch[-1][0]
+            mapping = {}
+            for _, name in batch:
+                if name and name not in mapping:
+                    target = self._target(name, directory)
+                    if target is not None:
+                        mapping[name] = target
+            if not mapping:
+                continue
+            moved += len(mapping)
+            if self.dry_run:
+                continue
+            self._move(mapping, models)
+            self.stdout.write(f"{source.__name__}: перенесено {moved}, последний id {last_pk}")
+
+    def _move(self, mapping: dict[str, str], models):
+        """
+        Жёсткая ссылка на новое место -> обновление имён в БД -> удаление старого имени.
+        Прерванный прогон оставляет лишь лишний файл (его уберёт gc_generated), но не строку без файла.
+        """
+        for old, new in list(mapping.items()):
+            new = mapping[old] = default_storage.get_available_name(new)
+            dst = media_path(new)
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(media_path(old), dst)
+            except OSError:
+                shutil.copy2(media_path(old), dst)
+        renamed = Case(*[When(file=old, then=Value(new)) for old, new in mapping.items()], default=F("file"), output_field=CharField())
+        with transaction.atomic():
+            for model in models:
+                model.objects.filter(file__in=mapping).update(file=renamed)
+        for old in mapping:
+            media_path(old).unlink(missing_ok=True)
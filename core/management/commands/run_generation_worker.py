@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from core.jobs import work
+
+
+class Command(BaseCommand):
+    help = "Воркер фоновой генерации: разбирает очередь GenerationJob"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Обработать очередь и выйти")
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="Пауза между опросами пустой очереди, с")
+        parser.add_argument("--chunk-size", type=int, default=50, help="Клиентов в одной порции (шаг прогресса)")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Воркер генерации запущен")
+        try:
+            work(poll_interval=options["poll_interval"], once=options["once"], chunk_size=options["chunk_size"])
+        except KeyboardInterrupt:
+            self.stdout.write("Остановлено")
@@ -0,0 +1,51 @@
+from itertools import groupby, islice
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.importer import bulk_update_clients
+from core.models import Client, Value
+
+
+class Command(BaseCommand):
+    help = "Переносит значения из Value в JSON-поле Client.attributes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500, help="Клиентов на одну транзакцию")
+        parser.add_argument("--after-client", type=int, default=0,
+                            help="Продолжить с клиента с id больше указанного (см. вывод прогресса)")
+        parser.add_argument("--dry-run", action="store_true", help="Только посчитать, ничего не записывать")
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options["chunk_size"])
+        values = Value.objects.filter(client_id__gt=options["after_client"]).order_by("client_id", "id")
+        total = values.count()
+        # Поток строк, упорядоченный по клиенту: значения одного клиента идут подряд
+        rows = values.values_list("client_id", "entity__key", "value").iterator(chunk_size=chunk_size * 20)
+        groups = groupby(rows, key=lambda row: row[0])
+
+        seen = updated = 0
+        while True:
+            chunk = {client_id: [(key, value) for _, key, value in group] for client_id, group in islice(groups, chunk_size)}
+            if not chunk:
+                break
+            clients = Client.objects.only("id", "attributes").in_bulk(chunk.keys())
+            changed = []
+            for client_id, pairs in chunk.items():
+                client = clients.get(client_id)
+                if client is None:
+                    continue
+                attrs = dict(client.attributes or {})
+                for key, value in pairs:
+                    attrs[key] = value or ""
+                if attrs != client.attributes:
+                    client.attributes = attrs
+                    client.filled_count = Client.count_filled(attrs)
+                    changed.append(client)
+            if changed and not options["dry_run"]:
+                with transaction.atomic():
+                    bulk_update_clients(changed, ("attributes", "filled_count"))
+            seen += sum(len(pairs) for pairs in chunk.values())
+            updated += len(changed)
+            self.stdout.write(f"Значений: {seen}/{total}, обновлено клиентов: {updated}, последний клиент: {max(chunk)}")
+
+        prefix = "Пробный прогон, ничего не записано. " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(f"{prefix}Готово. Обновлено клиентов: {updated}"))
@@ -0,0 +1,239 @@
+"""
+Слияние (mail merge): один шаблон для множества клиентов в ОДИН .docx.
+
+— Тело шаблона (w:body) клонируется на каждого клиента; записи разделяются разрывом раздела
+  со свойствами последнего раздела шаблона (новая страница, те же поля и колонтитулы).
+— Стили, нумерация, медиа, шапки и подвалы — общие: члены архива копируются один раз
+  байт-в-байт (core.xml_engine), rels у всех записей одни и те же.
+— Шапки и подвалы общие, поэтому значения в них берутся из shared_values, а не из атрибутов клиентов.
+— document.xml собирается и сжимается по мере рендера записей: в памяти одна запись,
+  а не весь документ, так что объём не растёт с числом клиентов.
+— id рисунков (wp:docPr) и закладок перенумеровываются, чтобы не повторяться между записями.
+"""
+import copy
+import zipfile
+from collections.abc import Iterable, Iterator
+from itertools import count
+from pathlib import Path
+
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from docx.opc.constants import CONTENT_TYPE as CT
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.oxml.parser import parse_xml
+from lxml import etree
+
+from .archive import _StreamBuffer
+from .blocks import compile_blocks, expand_blocks
+from .metrics import span
+from .utils import TemplateCache, _BOOKMARKS, _DOC_PR, _fill_paragraphs, _max_id, _renumber, _resolve_path, _scan_part
+from .xml_engine import _CONTENT_TYPES_NS, _RawZipWriter, _serialize
+
+_W14 = "http://schemas.microsoft.com/office/word/2010/wordml"
+_MARKER = "docxgen-merge"
+_DOCX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+class MergeTemplate:
+    """
+    Шаблон для слияния:
+    — frame: корень document.xml с пустым w:body; head/tail — его байты до и после содержимого тела;
+    — body: прототип тела без завершающего w:sectPr; slots — абзацы с плейсхолдерами,
+      blocks — [(path, Block)] якоря блоков core.blocks (пути от body);
+    — separator: абзац-разрыв раздела между записями;
+    — parts / part_slots / part_blocks: шапки и подвалы с плейсхолдерами;
+    — first_id: первый свободный id для wp:docPr и закладок; renumber — есть ли что перенумеровывать.
+    """
+    def __init__(self, path: Path, members: list[zipfile.ZipInfo], document_name: str, frame, head: bytes,
+                 tail: bytes, body, slots: list, blocks: list, separator, parts: dict, part_slots: list,
+                 part_blocks: list, first_id: int, renumber: bool, size: int):
+        self.path = path
+        self.members = members
+        self.document_name = document_name
+        self.frame = frame
+        self.head = head
+        self.tail = tail
+        self.body = body
+        self.slots = slots
+        self.blocks = blocks
+        self.separator = separator
+        self.parts = parts
+        self.part_slots = part_slots
+        self.part_blocks = part_blocks
+        self.first_id = first_id
+        self.renumber = renumber
+        self.size = size
+
+
+def _story_members(zf: zipfile.ZipFile) -> tuple[str, list[str]]:
+    """(document.xml, [шапки и подвалы]) по [Content_Types].xml."""
+    types = etree.fromstring(zf.read("[Content_Types].xml"))
+    document, stories = None, []
+    for el in types.iter(f"{{{_CONTENT_TYPES_NS}}}Override"):
+        content_type = el.get("ContentType")
+        if content_type == CT.WML_DOCUMENT_MAIN:
+            document = el.get("PartName").lstrip("/")
+        elif content_type in (CT.WML_HEADER, CT.WML_FOOTER):
+            stories.append(el.get("PartName").lstrip("/"))
+    if document is None:
+        raise ValueError("В шаблоне нет основной части документа")
+    return document, stories
+
+
+def _strip_para_ids(root):
+    # w14:paraId/textId должны быть уникальны в документе, а в копиях повторялись бы; они необязательны
+    for p in root.iter(qn("w:p")):
+        p.attrib.pop(f"{{{_W14}}}paraId", None)
+        p.attrib.pop(f"{{{_W14}}}textId", None)
+
+
+def _separator(section):
+    p = OxmlElement("w:p")
+    if section is None:
+        br = OxmlElement("w:br")
+        br.set(qn("w:type"), "page")
+        run = OxmlElement("w:r")
+        run.append(br)
+        p.append(run)
+    else:
+        ppr = OxmlElement("w:pPr")
+        ppr.append(copy.deepcopy(section))
+        p.append(ppr)
+    return p
+
+
+def _split_frame(frame, frame_body) -> tuple[bytes, bytes]:
+    """Байты документа до начала содержимого w:body и после него."""
+    marker = etree.Comment(_MARKER)
+    frame_body.insert(0, marker)
+    head, tail = _serialize(frame).split(f"<!--{_MARKER}-->".encode(), 1)
+    frame_body.remove(marker)
+    return head, tail
+
+
+def compile_merge_template(template_path) -> MergeTemplate:
+    path = Path(template_path)
+    with span("token_scan"), zipfile.ZipFile(path) as zf:
+        members = zf.infolist()
+        document_name, story_names = _story_members(zf)
+        data = zf.read(document_name)
+        frame = parse_xml(data)
+        size, first_id = len(data), _max_id(frame)
+        parts, part_slots, part_blocks = {}, [], []
+        for name in story_names:
+            story = zf.read(name)
+            root = parse_xml(story)
+            first_id = max(first_id, _max_id(root))
+            blocks_ = compile_blocks(name, root)
+            slots_ = _scan_part(name, root)
+            if slots_ or blocks_:
+                parts[name] = root
+                part_slots += slots_
+                part_blocks += blocks_
+                size += len(story)
+
+    frame_body = frame.find(qn("w:body"))
+    section = frame_body[-1] if len(frame_body) and frame_body[-1].tag == qn("w:sectPr") else None
+    body = copy.deepcopy(frame_body)
+    if section is not None:
+        body.remove(body[-1])
+    _strip_para_ids(body)
+    renumber = any(True for _ in body.iter(_DOC_PR, *_BOOKMARKS))
+
+    # Байты «рамки» документа: до содержимого тела и после него (с завершающим w:sectPr)
+    for child in list(frame_body):
+        if child is not section:
+            frame_body.remove(child)
+    head, tail = _split_frame(frame, frame_body)
+    if section is not None:
+        frame_body.remove(section)
+
+    blocks = [(p, block) for _, p, block in compile_blocks(document_name, body)]
+    slots = [p for _, p, _ in _scan_part(document_name, body)]
+    return MergeTemplate(path, members, document_name, frame, head, tail, body, slots, blocks,
+                         _separator(section), parts, part_slots, part_blocks, first_id + 1, renumber, size)
+
+
+merge_template_cache = TemplateCache(loader=compile_merge_template)
+
+
+class _Records:
+    """Рендер записей в байты содержимого w:body; одна рамка на слияние (кэшированный шаблон не меняется)."""
+    def __init__(self, compiled: MergeTemplate, default_placeholder: str):
+        self.compiled = compiled
+        self.default_placeholder = default_placeholder
+        self.frame = copy.deepcopy(compiled.frame)
+        self.frame_body = self.frame.find(qn("w:body"))
+        self.ids = count(compiled.first_id)
+        # Байты рамки с пустым телом: по ним из сериализованной записи вырезается только содержимое
+        self.prefix, self.suffix = _split_frame(self.frame, self.frame_body)
+
+    def render(self, values_dict: dict, first: bool) -> bytes:
+        compiled = self.compiled
+        with span("clone"):
+            body = copy.deepcopy(compiled.body)
+        with span("replace"):
+            paragraphs = [_resolve_path(body, path) for path in compiled.slots]
+            anchors = [(_resolve_path(body, path), block) for path, block in compiled.blocks]
+            _fill_paragraphs(paragraphs, values_dict, self.default_placeholder)
+            expand_blocks(anchors, values_dict, self.default_placeholder, self.ids)
+            if compiled.renumber:
+                _renumber([body], self.ids)
+        if not first:
+            body.insert(0, copy.deepcopy(compiled.separator))
+        with span("save"):
+            self.frame_body.extend(body)
+            data = _serialize(self.frame)
+            del self.frame_body[:]
+        return data[len(self.prefix):len(data) - len(self.suffix)]
+
+
+def iter_merged(template_path, values_iter: Iterable[dict], shared_values: dict | None = None,
+                default_placeholder: str = "—") -> Iterator[bytes]:
+    """
+    Отдаёт байты объединённого .docx по мере рендера: по куску на запись.
+    values_iter — атрибуты клиентов по порядку; читается один раз (подходит QuerySet.iterator()).
+    Шаблон разбирается сразу, до первого куска: ошибка шаблона не оборвёт уже начатый ответ.
+    """
+    compiled = merge_template_cache.get(template_path)
+    return _merged_chunks(compiled, values_iter, shared_values or {}, default_placeholder)
+
+
+def _merged_chunks(compiled: MergeTemplate, values_iter: Iterable[dict], shared_values: dict,
+                   default_placeholder: str) -> Iterator[bytes]:
+    buffer = _StreamBuffer()
+    writer = _RawZipWriter(buffer)
+    records = _Records(compiled, default_placeholder)
+
+    roots = {name: copy.deepcopy(root) for name, root in compiled.parts.items()}
+    paragraphs = [_resolve_path(roots[name], path) for name, path, _ in compiled.part_slots]
+    anchors = [(_resolve_path(roots[name], path), block) for name, path, block in compiled.part_blocks]
+    _fill_paragraphs(paragraphs, shared_values, default_placeholder)
+    expand_blocks(anchors, shared_values, default_placeholder, records.ids)
+
+    with open(compiled.path, "rb") as src:
+        for info in compiled.members:
+            if info.filename == compiled.document_name:
+                member = writer.open_stream(info)
+                member.write(compiled.head)
+                for n, values in enumerate(values_iter):
+                    member.write(records.render(values or {}, first=n == 0))
+                    yield buffer.pop()
+                member.write(compiled.tail)
+                member.close()
+            elif info.filename in roots:
+                writer.write_bytes(info, _serialize(roots[info.filename]))
+            else:
+                writer.copy_raw(src, info)
+            yield buffer.pop()
+    writer.close()
+    yield buffer.pop()
+
+
+def merge_response(template_path, values_iter: Iterable[dict], filename: str,
+                   shared_values: dict | None = None) -> StreamingHttpResponse:
+    response = StreamingHttpResponse(iter_merged(template_path, values_iter, shared_values),
+                                     content_type=_DOCX_CONTENT_TYPE)
+    response["Content-Disposition"] = content_disposition_header(as_attachment=True, filename=filename)
+    return response
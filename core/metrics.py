@@ -0,0 +1,159 @@
+"""
+Метрики генерации в формате Prometheus (text exposition 0.0.4), без внешних зависимостей.
+
+— span("stage"): замер этапа (разбор шаблона, подстановка, сохранение, запись в БД ...)
+  в гистограмму docxgen_stage_seconds; внутри запроса этапы ещё и копятся для заголовка Server-Timing.
+— render_seconds: полный рендер одного документа по шаблонам; http_seconds / db_queries —
+  по view (заполняет core.middleware.MetricsMiddleware).
+— exposition(): текст для /metrics, включая счётчики кэшей шаблонов и рендера.
+Значения живут в памяти процесса: у каждого воркера gunicorn и процесса пула (core.parallel) свои.
+"""
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_lock = threading.Lock()
+_local = threading.local()
+_registry: list = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help_text, labelnames
+        self._values: dict[tuple, float] = {}
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[n] for n in self.labelnames)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def lines(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            out.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return out
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help_text, labelnames
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple, list] = {}  # key -> [счётчики по корзинам (+Inf последней), сумма, число]
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[n] for n in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def lines(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                le = f'le="{bound}"'
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return out
+
+
+stage_seconds = Histogram("docxgen_stage_seconds", "Длительность этапов генерации", ("stage",))
+render_seconds = Histogram("docxgen_render_seconds", "Полный рендер одного документа", ("template", "engine"))
+http_seconds = Histogram("docxgen_http_request_seconds", "Время ответа view", ("view", "method"))
+db_queries = Histogram("docxgen_db_queries_per_request", "SQL-запросов на один HTTP-запрос", ("view",),
+                       buckets=QUERY_BUCKETS)
+profiled_requests = Counter("docxgen_profiled_requests_total", "Запросов, снятых профилировщиком", ("view",))
+
+
+@contextmanager
+def span(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, stage=stage)
+        spans = getattr(_local, "spans", None)
+        if spans is not None:
+            spans[stage] = spans.get(stage, 0.0) + elapsed
+
+
+def begin_request():
+    _local.spans = {}
+
+
+def end_request() -> dict[str, float]:
+    """Суммарное время по этапам за текущий запрос."""
+    spans = getattr(_local, "spans", None) or {}
+    _local.spans = None
+    return spans
+
+
+def _cache_lines(name: str, help_text: str, stats: dict) -> list[str]:
+    hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+    total = hits + misses
+    lines = [
+        f"# HELP {name}_hits_total {help_text}: попадания", f"# TYPE {name}_hits_total counter",
+        f"{name}_hits_total {hits}",
+        f"# HELP {name}_misses_total {help_text}: промахи", f"# TYPE {name}_misses_total counter",
+        f"{name}_misses_total {misses}",
+        f"# HELP {name}_hit_ratio {help_text}: доля попаданий", f"# TYPE {name}_hit_ratio gauge",
+        f"{name}_hit_ratio {_number(hits / total if total else 0.0)}",
+    ]
+    if "entries" in stats:
+        lines += [
+            f"# HELP {name}_entries {help_text}: записей", f"# TYPE {name}_entries gauge",
+            f"{name}_entries {stats['entries']}",
+            f"# HELP {name}_bytes {help_text}: объём", f"# TYPE {name}_bytes gauge",
+            f"{name}_bytes {stats['bytes']}",
+        ]
+    return lines
+
+
+def exposition() -> str:
+    from . import render_cache
+    from .utils import template_cache
+
+    with _lock:
+        lines = [line for metric in _registry for line in metric.lines()]
+    lines += _cache_lines("docxgen_template_cache", "Кэш разобранных шаблонов", template_cache.stats())
+    xml_engine = sys.modules.get("core.xml_engine")
+    if xml_engine is not None:
+        lines += _cache_lines("docxgen_xml_template_cache", "Кэш шаблонов XML-движка",
+                              xml_engine.xml_template_cache.stats())
+    merge = sys.modules.get("core.merge")
+    if merge is not None:
+        lines += _cache_lines("docxgen_merge_template_cache", "Кэш шаблонов слияния", merge.merge_template_cache.stats())
+    with render_cache._lock:
+        render_stats = dict(render_cache.stats)
+    lines += _cache_lines("docxgen_render_cache", "Кэш результатов рендера", render_stats)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,140 @@
+"""
+MetricsMiddleware: время ответа и число SQL-запросов на каждый запрос (core.metrics),
+заголовок Server-Timing с этапами генерации и выборочное профилирование.
+
+Профилирование: доля запросов DOCXGEN_PROFILE_SAMPLE_RATE (0 — выключено) снимается
+cProfile или, при DOCXGEN_PROFILER=pyinstrument и установленном пакете, pyinstrument.
+Отчёты пишутся в DOCXGEN_PROFILE_DIR: <время>-<view>.prof (pstats) или .html.
+Одновременно профилируется не больше одного запроса: cProfile на Python 3.12+ работает через
+sys.monitoring, и второй профилировщик в соседнем потоке (gunicorn --threads) падает с ошибкой.
+Запрос, попавший в выборку, пока занят профилировщик, выполняется без профиля.
+
+Под ASGI middleware работает асинхронно (иначе async-view выполнялись бы в потоке): там меряется
+только время ответа — запросы к БД и этапы выполняются в других потоках, а профилировщик
+не видит их, поэтому счётчик SQL и профилирование доступны только в синхронном режиме.
+"""
+import cProfile
+import logging
+import random
+import threading
+import time
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pyinstrument import Profiler as _Pyinstrument
+except ImportError:  # необязательная зависимость
+    _Pyinstrument = None
+
+_profile_lock = threading.Lock()
+
+
+def _view_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name or match._func_path
+
+
+def _profile_path(view: str, suffix: str) -> Path:
+    directory = Path(settings.DOCXGEN_PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    safe_view = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in view)
+    return directory / f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{safe_view}{suffix}"
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        if not getattr(settings, "DOCXGEN_METRICS", True):
+            return self.get_response(request)
+
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        rate = getattr(settings, "DOCXGEN_PROFILE_SAMPLE_RATE", 0.0)
+        sampled = rate > 0 and random.random() < rate
+
+        metrics.begin_request()
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            if sampled and _profile_lock.acquire(blocking=False):
+                try:
+                    response = self._profiled(request)
+                finally:
+                    _profile_lock.release()
+            else:
+                response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        spans = metrics.end_request()
+
+        # Для потоковых ответов это время до первого байта, а не до конца передачи
+        view = _view_name(request)
+        metrics.http_seconds.observe(elapsed, view=view, method=request.method)
+        metrics.db_queries.observe(queries, view=view)
+        timing = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in spans.items()]
+        timing.append(f'db;desc="{queries} queries"')
+        timing.append(f"total;dur={elapsed * 1000:.1f}")
+        response["Server-Timing"] = ", ".join(timing)
+        return response
+
+    async def _acall(self, request):
+        if not getattr(settings, "DOCXGEN_METRICS", True):
+            return await self.get_response(request)
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        elapsed = time.perf_counter() - started
+        metrics.http_seconds.observe(elapsed, view=_view_name(request), method=request.method)
+        response["Server-Timing"] = f"total;dur={elapsed * 1000:.1f}"
+        return response
+
+    def _profiled(self, request):
+        use_pyinstrument = getattr(settings, "DOCXGEN_PROFILER", "cprofile") == "pyinstrument"
+        if use_pyinstrument and _Pyinstrument is None:
+            logger.warning("DOCXGEN_PROFILER=pyinstrument, но пакет не установлен — используется cProfile")
+            use_pyinstrument = False
+
+        if use_pyinstrument:
+            profiler = _Pyinstrument()
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+        else:
+            profiler = cProfile.Profile()
+            response = profiler.runcall(self.get_response, request)
+
+        view = _view_name(request)
+        try:
+            # Сбой записи отчёта не должен ломать сам запрос
+            if use_pyinstrument:
+                _profile_path(view, ".html").write_text(profiler.output_html(), encoding="utf-8")
+            else:
+                profiler.dump_stats(_profile_path(view, ".prof"))
+        except OSError:
+            logger.exception("Не удалось сохранить профиль запроса %s", view)
+        else:
+            metrics.profiled_requests.inc(view=view)
+        return response
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_generationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('file', models.FileField(upload_to='generated/')),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_hit_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Кэш рендера',
+                'verbose_name_plural': 'Кэш рендера',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='generateddocument',
+            index=models.Index(fields=['file'], name='core_genera_file_53f691_idx'),
+        ),
+        migrations.AddField(
+            model_name='rendercacheentry',
+            name='template',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='render_cache', to='core.template'),
+        ),
+        migrations.AddIndex(
+            model_name='rendercacheentry',
+            index=models.Index(fields=['file'], name='core_render_file_64bda1_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:53
+
+import core.utils
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_render_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='template',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64, verbose_name='SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='template',
+            name='size',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Размер, байт'),
+        ),
+        migrations.AlterField(
+            model_name='template',
+            name='file',
+            field=models.FileField(upload_to='templates/', validators=[core.utils.validate_docx], verbose_name='Файл .docx'),
+        ),
+        migrations.CreateModel(
+            name='TemplatePlaceholder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(db_index=True, max_length=255)),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='placeholders', to='core.template')),
+            ],
+            options={
+                'verbose_name': 'Плейсхолдер шаблона',
+                'verbose_name_plural': 'Плейсхолдеры шаблонов',
+                'ordering': ['key'],
+                'unique_together': {('template', 'key')},
+            },
+        ),
+    ]
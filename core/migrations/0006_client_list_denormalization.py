@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:54
+
+from django.db import migrations, models
+
+
+def fill_client_fields(apps, schema_editor):
+    Client = apps.get_model("core", "Client")
+    batch = []
+    for client in Client.objects.only("id", "name", "attributes").iterator(chunk_size=1000):
+        client.search_name = (client.name or "").casefold()
+        client.filled_count = sum(1 for v in (client.attributes or {}).values() if v not in (None, "", [], {}))
+        batch.append(client)
+        if len(batch) >= 1000:
+            Client.objects.bulk_update(batch, ["search_name", "filled_count"])
+            batch = []
+    if batch:
+        Client.objects.bulk_update(batch, ["search_name", "filled_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_template_placeholders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='filled_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Заполнено'),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='search_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['name'], name='core_client_name_76d9ae_idx'),
+        ),
+        migrations.RunPython(fill_client_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:06
+
+import core.storage
+import core.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_client_list_denormalization'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='generateddocument',
+            name='file',
+            field=models.FileField(max_length=255, upload_to=core.storage.generated_upload_to),
+        ),
+        migrations.AlterField(
+            model_name='rendercacheentry',
+            name='file',
+            field=models.FileField(max_length=255, upload_to=core.storage.generated_upload_to),
+        ),
+        migrations.AlterField(
+            model_name='template',
+            name='file',
+            field=models.FileField(max_length=255, upload_to=core.storage.template_upload_to, validators=[core.utils.validate_docx], verbose_name='Файл .docx'),
+        ),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from .storage import generated_upload_to, template_upload_to
+from .utils import validate_docx
+
 
 class Entity(models.Model):
     name = models.CharField(max_length=255, verbose_name=_("Название"))
@@ -30,15 +33,41 @@ class Client(models.Model):
     # Новое: значения атрибутов клиента хранятся прямо в JSON
     # Пример: {"FIO": "Иванов И.И.", "ADDRESS": "..."}
     attributes = models.JSONField(default=dict, blank=True, verbose_name=_("Атрибуты"))
+    # Денормализация для списка клиентов: пересчитываются в save(), не при чтении
+    search_name = models.CharField(max_length=255, default="", editable=False, db_index=True)
+    filled_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("Заполнено"))
 
     class Meta:
         verbose_name = _("Клиент")
         verbose_name_plural = _("Клиенты")
         ordering = ["name"]
+        indexes = [models.Index(fields=["name"])]
 
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def count_filled(attributes) -> int:
+        """Сколько атрибутов реально заполнено (пустые строки/списки не считаются)."""
+        return sum(1 for v in (attributes or {}).values() if v not in (None, "", [], {}))
+
+    @staticmethod
+    def normalize_search(name: str) -> str:
+        return (name or "").casefold()
+
+    def save(self, *args, **kwargs):
+        self.search_name = self.normalize_search(self.name)
+        self.filled_count = self.count_filled(self.attributes)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if "name" in update_fields:
+                update_fields.add("search_name")
+            if "attributes" in update_fields:
+                update_fields.add("filled_count")
+            kwargs["update_fields"] = update_fields
+        super().save(*args, **kwargs)
+
 
 # Оставляем модель Value для обратной совместимости (можно удалить после миграции данных)
 class Value(models.Model):
@@ -58,8 +87,11 @@ class Value(models.Model):
 
 class Template(models.Model):
     name = models.CharField(max_length=255, verbose_name=_("Название шаблона"))
-    file = models.FileField(upload_to="templates/", verbose_name=_("Файл .docx"))
+    file = models.FileField(upload_to=template_upload_to, max_length=255, validators=[validate_docx], verbose_name=_("Файл .docx"))
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Заполняются при загрузке (core.services.index_template)
+    content_hash = models.CharField(max_length=64, blank=True, default="", db_index=True, verbose_name=_("SHA-256"))
+    size = models.PositiveBigIntegerField(default=0, verbose_name=_("Размер, байт"))
 
     class Meta:
         verbose_name = _("Шаблон")
@@ -70,16 +102,86 @@ class Template(models.Model):
         return self.name
 
 
+class TemplatePlaceholder(models.Model):
+    """Плейсхолдер, найденный в шаблоне; key — нормализованный ключ (без пробелов, в нижнем регистре)."""
+    template = models.ForeignKey(Template, on_delete=models.CASCADE, related_name="placeholders")
+    key = models.CharField(max_length=255, db_index=True)
+
+    class Meta:
+        verbose_name = _("Плейсхолдер шаблона")
+        verbose_name_plural = _("Плейсхолдеры шаблонов")
+        unique_together = ("template", "key")
+        ordering = ["key"]
+
+    def __str__(self):
+        return f"{self.template} – {{{self.key}}}"
+
+
 class GeneratedDocument(models.Model):
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name="generated_docs")
     template = models.ForeignKey(Template, on_delete=models.SET_NULL, null=True, related_name="generated_docs")
-    file = models.FileField(upload_to="generated/")
+    file = models.FileField(upload_to=generated_upload_to, max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         verbose_name = _("Сгенерированный документ")
         verbose_name_plural = _("Сгенерированные документы")
         ordering = ["-created_at"]
+        # один файл может принадлежать нескольким строкам (кэш рендера) — ищем ссылки по имени
+        indexes = [models.Index(fields=["file"])]
+
+    def __str__(self):
+        return f"{self.client} – {self.template} – {self.created_at:%Y-%m-%d %H:%M}"
+
+
+class RenderCacheEntry(models.Model):
+    """Готовый файл для пары (содержимое шаблона, атрибуты клиента) — см. core.render_cache."""
+    key = models.CharField(max_length=64, unique=True)
+    template = models.ForeignKey(Template, on_delete=models.CASCADE, related_name="render_cache")
+    file = models.FileField(upload_to=generated_upload_to, max_length=255)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Кэш рендера")
+        verbose_name_plural = _("Кэш рендера")
+        indexes = [models.Index(fields=["file"])]
+
+    def __str__(self):
+        return f"{self.template} – {self.key[:12]} ({self.hits})"
+
+
+class GenerationJob(models.Model):
+    """Фоновая пакетная генерация: очередь в БД, её разбирает команда run_generation_worker."""
+    class Status(models.TextChoices):
+        QUEUED = "queued", _("В очереди")
+        RUNNING = "running", _("Выполняется")
+        DONE = "done", _("Готово")
+        FAILED = "failed", _("Ошибка")
+
+    template = models.ForeignKey(Template, on_delete=models.CASCADE, related_name="jobs")
+    client_ids = models.JSONField(default=list)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.QUEUED)
+    total = models.PositiveIntegerField(default=0)
+    done = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    documents = models.ManyToManyField(GeneratedDocument, blank=True, related_name="jobs")
+    worker = models.CharField(max_length=128, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Задание генерации")
+        verbose_name_plural = _("Задания генерации")
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "created_at"])]
 
     def __str__(self):
-        return f"{self.client} – {self.template} – {self.created_at:%Y-%m-%d %H:%M}"
\ No newline at end of file
+        return f"#{self.pk} {self.template} – {self.get_status_display()} ({self.done}/{self.total})"
+
+    @property
+    def progress(self) -> float:
+        return round(self.done / self.total, 4) if self.total else 1.0
@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация по первичному ключу: стабильна при вставках, страница = WHERE id > X LIMIT N
+    без OFFSET. Порядок — атрибут cursor_ordering у view ("id" по умолчанию).
+    """
+    ordering = "id"
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, "cursor_ordering", self.ordering)
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
@@ -0,0 +1,115 @@
+"""
+Параллельный рендер пакетов в пуле процессов.
+
+Рендер — чистый CPU на Python: потоки gunicorn (GUNICORN_THREADS) делят один GIL,
+поэтому большие пакеты раздаются в ProcessPoolExecutor (DOCXGEN_RENDER_WORKERS процессов).
+— Пул свой у каждого воркера gunicorn: всего процессов рендера
+  GUNICORN_WORKERS × DOCXGEN_RENDER_WORKERS — их число стоит выбирать с учётом ядер.
+— Процессы живут между вызовами: кэш разобранных шаблонов в них остаётся тёплым,
+  при старте они заранее разбирают последние загруженные шаблоны.
+— Воркеры только рендерят и возвращают пути к файлам; ORM они не трогают,
+  все записи в БД делает родительский процесс.
+— Процессы запускаются через spawn: они не наследуют открытые соединения с БД.
+— Упавший кусок удаляет уже записанные им файлы сам, остальные куски — родительский процесс.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from django.conf import settings
+
+from .utils import generate_document, template_cache
+
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker(preload: tuple[str, ...]):
+    import django
+
+    django.setup()
+    for path in preload:
+        try:
+            template_cache.get(path)
+        except (OSError, ValueError):
+            pass  # файл удалён или битый — разберётся при первом реальном рендере
+
+
+def _render_sequential(template_path, values_list: list[dict], default_placeholder: str) -> list[Path]:
+    """Рендер подряд; при ошибке уже созданные файлы удаляются."""
+    paths = []
+    try:
+        for values in values_list:
+            paths.append(generate_document(template_path, values, default_placeholder))
+    except BaseException:
+        for path in paths:
+            Path(path).unlink(missing_ok=True)
+        raise
+    return paths
+
+
+def _render_chunk(template_path: str, values_list: list[dict], default_placeholder: str) -> list[str]:
+    return [str(path) for path in _render_sequential(template_path, values_list, default_placeholder)]
+
+
+def _preload_paths() -> tuple[str, ...]:
+    from .models import Template
+
+    limit = getattr(settings, "DOCXGEN_TEMPLATE_CACHE_SIZE", 32)
+    return tuple(t.file.path for t in Template.objects.exclude(file="")[:limit])
+
+
+def render_workers() -> int:
+    return getattr(settings, "DOCXGEN_RENDER_WORKERS", 0)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=render_workers(),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(_preload_paths(),),
+            )
+        return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(cancel_futures=True)
+            _executor = None
+
+
+def render_many(template_path, values_list: list[dict], default_placeholder: str = "—") -> list[Path]:
+    """
+    Рендерит шаблон для каждого словаря значений; порядок результата совпадает с values_list.
+    При DOCXGEN_RENDER_WORKERS < 2 всё выполняется в текущем процессе.
+    Если хотя бы один кусок упал, уже созданные файлы удаляются и исключение пробрасывается.
+    """
+    workers = render_workers()
+    if workers < 2 or len(values_list) < 2:
+        return _render_sequential(template_path, values_list, default_placeholder)
+
+    # Кусков в несколько раз больше, чем процессов, — чтобы медленный кусок не держал весь пакет
+    chunk_size = max(1, -(-len(values_list) // (workers * 4)))
+    chunks = [values_list[i:i + chunk_size] for i in range(0, len(values_list), chunk_size)]
+    executor = get_executor()
+    futures = [executor.submit(_render_chunk, str(template_path), chunk, default_placeholder) for chunk in chunks]
+    wait(futures)
+
+    errors = [f.exception() for f in futures if f.exception() is not None]
+    if errors:
+        for f in futures:
+            if f.exception() is None:
+                for path in f.result():
+                    Path(path).unlink(missing_ok=True)
+        if any(isinstance(e, BrokenProcessPool) for e in errors):
+            shutdown_executor()  # следующий вызов поднимет пул заново
+        raise errors[0]
+    return [Path(path) for f in futures for path in f.result()]
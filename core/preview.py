@@ -0,0 +1,107 @@
+"""
+Быстрый предпросмотр: текст (или HTML-фрагмент) шаблона с подставленными значениями клиента
+без сборки .docx. Текст абзацев и позиции токенов берутся из скомпилированного шаблона
+(кэш core.utils) и режутся на куски один раз; предпросмотр — только склейка строк.
+Блоки {#KEY}/{^KEY} (core.blocks) разворачиваются по тем же правилам, что и при рендере.
+"""
+import threading
+import weakref
+from html import escape
+from typing import NamedTuple
+
+from docx.oxml.ns import qn
+from lxml import etree
+
+from .utils import TOKEN_RE, _BLOCK_SIGILS, _as_text, _norm, _resolve_path, _story_parts
+
+# compiled -> [абзац | _BlockSegments]; абзац — (кусок, ...): str — текст как есть,
+# (key,) — нормализованный ключ плейсхолдера
+_segments: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+class _BlockSegments(NamedTuple):
+    block: object
+    segments: list
+
+
+def _split(text: str) -> tuple:
+    pieces, pos = [], 0
+    for m in TOKEN_RE.finditer(text):
+        if m.start() > pos:
+            pieces.append(text[pos:m.start()])
+        key = _norm(m.group(1))
+        # Маркер блока без пары остаётся в тексте, как и при рендере
+        pieces.append(m.group(0) if key[:1] in _BLOCK_SIGILS else (key,))
+        pos = m.end()
+    if pos < len(text):
+        pieces.append(text[pos:])
+    return tuple(pieces)
+
+
+def _walk(elements, anchors: dict) -> list:
+    segments = []
+    for element in elements:
+        for el in element.iter(qn("w:p"), etree.Comment):
+            if el.tag is not etree.Comment:
+                segments.append(_split(el.text or ""))
+            elif el in anchors:
+                block = anchors[el]
+                nested = {_resolve_path(block.elements[path[0]], path[1:]): child for path, child in block.anchors}
+                segments.append(_BlockSegments(block, _walk(block.elements, nested)))
+    return segments
+
+
+def template_segments(compiled) -> list:
+    """Абзацы шаблона (тело, затем шапки и подвалы), разрезанные по плейсхолдерам; блоки — вложенными списками."""
+    with _lock:
+        segments = _segments.get(compiled)
+        if segments is not None:
+            return segments
+        segments = []
+        for part in _story_parts(compiled.document):
+            partname = str(part.partname)
+            anchors = {
+                _resolve_path(part.element, path): block
+                for name, path, block in compiled.blocks if name == partname
+            }
+            segments += _walk([part.element], anchors)
+        _segments[compiled] = segments
+    return segments
+
+
+def preview(compiled, values_dict: dict, default_placeholder: str = "—", html: bool = False) -> tuple[str, list[str]]:
+    """
+    Возвращает (текст или HTML, отсутствующие ключи). Отсутствующий ключ — тот, вместо которого
+    при рендере подставится default_placeholder. В HTML значения обёрнуты в
+    <span class="value">, заглушки — в <mark class="missing" data-key="...">.
+    """
+    raw = {_norm(k): v for k, v in (values_dict or {}).items()}
+    text = {k: _as_text(v) for k, v in raw.items()}
+    missing: set[str] = set()
+    lines: list[str] = []
+    _emit(template_segments(compiled), raw, text, default_placeholder, html, missing, lines)
+    return ("" if html else "\n").join(lines), sorted(missing)
+
+
+def _emit(segments: list, raw, text, default_placeholder: str, html: bool, missing: set, lines: list):
+    for pieces in segments:
+        if isinstance(pieces, _BlockSegments):
+            for item_raw, item_text in pieces.block.scopes(raw, text):
+                _emit(pieces.segments, item_raw, item_text, default_placeholder, html, missing, lines)
+            continue
+        out = []
+        for piece in pieces:
+            if isinstance(piece, str):
+                out.append(escape(piece) if html else piece)
+                continue
+            key = piece[0]
+            value = text.get(key)
+            if value is None:
+                missing.add(key)
+                out.append(f'<mark class="missing" data-key="{escape(key)}">{escape(default_placeholder)}</mark>'
+                           if html else default_placeholder)
+            else:
+                out.append(f'<span class="value">{escape(value)}</span>' if html else value)
+        line = "".join(out)
+        lines.append(f"<p>{line.replace(chr(10), '<br>')}</p>" if html else line)
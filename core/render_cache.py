@@ -0,0 +1,115 @@
+"""
+Кэш результатов рендера по содержимому: ключ = sha256 шаблона + канонический хеш
+нормализованных атрибутов клиента. Одинаковые входы дают ссылку на уже готовый файл
+вместо нового рендера: несколько GeneratedDocument могут указывать на один файл.
+
+Записи без ссылок из GeneratedDocument удаляются evict_unreferenced()
+(команда prune_render_cache) вместе с файлами.
+"""
+import hashlib
+import json
+import threading
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from .models import GeneratedDocument, RenderCacheEntry
+from .utils import _norm
+
+# Меняется, когда меняется сам рендер: старые записи перестают совпадать
+_KEY_VERSION = "3"
+
+_lock = threading.Lock()
+_template_hashes: dict[str, tuple[tuple[int, int], str]] = {}
+stats = {"hits": 0, "misses": 0}
+
+
+def enabled() -> bool:
+    return getattr(settings, "DOCXGEN_RENDER_CACHE", True)
+
+
+def file_sha256(path) -> str:
+    """sha256 файла; для неизменившегося файла (mtime + размер) берётся из памяти."""
+    path = Path(path).resolve()
+    st = path.stat()
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        cached = _template_hashes.get(str(path))
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with open(path, "rb") as f:
+        digest = hashlib.file_digest(f, "sha256").hexdigest()
+    with _lock:
+        _template_hashes[str(path)] = (stamp, digest)
+    return digest
+
+
+def values_hash(values_dict: dict, default_placeholder: str) -> str:
+    """Хеш значений после той же нормализации ключей, что и при рендере."""
+    values_norm = {_norm(k): v for k, v in (values_dict or {}).items()}
+    payload = json.dumps([values_norm, default_placeholder], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def render_key(template_hash: str, values_dict: dict, default_placeholder: str = "—") -> str:
+    raw = f"{_KEY_VERSION}:{template_hash}:{values_hash(values_dict, default_placeholder)}"
+    return hashlib.sha256(raw.encode("ascii")).hexdigest()
+
+
+def lookup(keys: list[str]) -> dict[str, str]:
+    """
+    {ключ: имя файла} для ключей, чей файл ещё на диске. Записи с пропавшим файлом удаляются.
+    Счётчики hits у найденных записей увеличиваются.
+    """
+    found, missing_files = {}, []
+    for entry in RenderCacheEntry.objects.filter(key__in=set(keys)).only("pk", "key", "file"):
+        if entry.file and Path(entry.file.path).exists():
+            found[entry.key] = entry.file.name
+        else:
+            missing_files.append(entry.pk)
+    if missing_files:
+        RenderCacheEntry.objects.filter(pk__in=missing_files).delete()
+    if found:
+        RenderCacheEntry.objects.filter(key__in=found).update(hits=F("hits") + 1, last_hit_at=timezone.now())
+    return found
+
+
+def store(template, fresh: dict[str, str]):
+    """Запоминает свежеотрендеренные файлы {ключ: имя файла}."""
+    RenderCacheEntry.objects.bulk_create(
+        [RenderCacheEntry(key=key, template=template, file=name) for key, name in fresh.items()],
+        batch_size=500, ignore_conflicts=True,
+    )
+
+
+def record(hits: int, misses: int):
+    with _lock:
+        stats["hits"] += hits
+        stats["misses"] += misses
+
+
+def evict_unreferenced(older_than: timedelta = timedelta(days=1), batch_size: int = 500) -> int:
+    """
+    Удаляет записи (и их файлы), на которые не ссылается ни один GeneratedDocument
+    и к которым не обращались дольше older_than. Возвращает число удалённых записей.
+    """
+    cutoff = timezone.now() - older_than
+    candidates = (
+        RenderCacheEntry.objects
+        .filter(Q(last_hit_at__lt=cutoff) | Q(last_hit_at__isnull=True, created_at__lt=cutoff))
+        .annotate(referenced=Exists(GeneratedDocument.objects.filter(file=OuterRef("file"))))
+        .filter(referenced=False)
+    )
+    removed = 0
+    while True:
+        batch = list(candidates.only("pk", "file")[:batch_size])
+        if not batch:
+            return removed
+        for entry in batch:
+            if entry.file:
+                Path(entry.file.path).unlink(missing_ok=True)
+        RenderCacheEntry.objects.filter(pk__in=[e.pk for e in batch]).delete()
+        removed += len(batch)
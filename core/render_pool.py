@@ -0,0 +1,87 @@
+"""
+Ограниченный пул для тяжёлых операций из async-view (запуск под ASGI: GUNICORN_ASGI=1 в entrypoint.sh).
+
+Рендер и запись в БД выполняются в пуле из DOCXGEN_ASYNC_RENDER_THREADS потоков; одновременно
+в работе и в ожидании может быть не больше DOCXGEN_ASYNC_RENDER_THREADS + DOCXGEN_ASYNC_RENDER_QUEUE
+задач. Сверх этого submit() сразу бросает Saturated с оценкой Retry-After — очередь не растёт,
+а event loop остаётся свободным для лёгких запросов (списки, атрибуты).
+"""
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+_slots: threading.BoundedSemaphore | None = None
+_avg_seconds = 1.0  # скользящее среднее длительности задачи, для Retry-After
+
+
+class Saturated(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Очередь рендера заполнена, повторите через {retry_after} с")
+        self.retry_after = retry_after
+
+
+def _limits() -> tuple[int, int]:
+    return (
+        max(1, getattr(settings, "DOCXGEN_ASYNC_RENDER_THREADS", 2)),
+        max(0, getattr(settings, "DOCXGEN_ASYNC_RENDER_QUEUE", 8)),
+    )
+
+
+def _pool() -> tuple[ThreadPoolExecutor, threading.BoundedSemaphore]:
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            threads, queue = _limits()
+            _executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="docxgen-render")
+            _slots = threading.BoundedSemaphore(threads + queue)
+        return _executor, _slots
+
+
+def retry_after() -> int:
+    """Сколько секунд ждать: время на разбор полной очереди при текущей средней длительности задачи."""
+    threads, queue = _limits()
+    return max(1, math.ceil(_avg_seconds * (threads + queue) / threads))
+
+
+def _run(fn, args):
+    global _avg_seconds
+    started = time.perf_counter()
+    # Потоки пула живут долго — соединения с БД обслуживаем, как Django в начале и конце запроса
+    close_old_connections()
+    try:
+        return fn(*args)
+    finally:
+        close_old_connections()
+        elapsed = time.perf_counter() - started
+        with _lock:
+            _avg_seconds = 0.8 * _avg_seconds + 0.2 * elapsed
+
+
+async def submit(fn, *args):
+    """Выполняет синхронную fn(*args) в пуле; без свободного места — Saturated."""
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        raise Saturated(retry_after())
+    try:
+        future = executor.submit(_run, fn, args)
+    except BaseException:
+        slots.release()
+        raise
+    # Место освобождается, когда задача реально закончилась (даже если клиент уже отключился)
+    future.add_done_callback(lambda _: slots.release())
+    return await asyncio.wrap_future(future)
+
+
+def shutdown():
+    global _executor, _slots
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = _slots = None
@@ -0,0 +1,171 @@
+"""
+Хранение и сборка мусора в MEDIA_ROOT/generated.
+
+— release_files(): удаляет файлы, на которые больше не ссылаются ни GeneratedDocument,
+  ни кэш рендера (один файл может принадлежать нескольким строкам).
+  Вызывается после коммита удаления строк (core.signals), в том числе при каскаде от Client.
+— delete_missing_rows(): строки, чей файл пропал с диска.
+— delete_orphan_files(): файлы на диске, на которые нет ни одной строки.
+— apply_retention(): удаление документов старше N дней и сверх K последних на клиента.
+Всё работает порциями по batch_size: ни таблица, ни каталог не читаются целиком.
+"""
+import logging
+import os
+import time
+from dataclasses import dataclass, asdict
+from datetime import timedelta
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from . import render_cache
+from .models import GeneratedDocument, RenderCacheEntry
+from .storage import GENERATED_DIR, media_path
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GcReport:
+    missing_rows: int = 0
+    orphan_files: int = 0
+    expired: int = 0
+    over_limit: int = 0
+    cache_evicted: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _referenced(names) -> set[str]:
+    names = set(names)
+    return (
+        set(GeneratedDocument.objects.filter(file__in=names).values_list("file", flat=True))
+        | set(RenderCacheEntry.objects.filter(file__in=names).values_list("file", flat=True))
+    )
+
+
+def release_files(names) -> int:
+    """Удаляет с диска файлы из names, если на них не осталось ссылок. Возвращает число удалённых."""
+    names = {name for name in names if name}
+    removed = 0
+    for name in names - _referenced(names):
+        try:
+            os.remove(media_path(name))
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def _delete_documents(pks: list[int], dry_run: bool) -> int:
+    """Удаляет строки; файлы освобождает обработчик post_delete после коммита."""
+    if not dry_run:
+        GeneratedDocument.objects.filter(pk__in=pks).delete()
+    return len(pks)
+
+
+def delete_missing_rows(batch_size: int = 500, dry_run: bool = False) -> int:
+    """Удаляет GeneratedDocument, чей файл отсутствует на диске (обход по pk порциями)."""
+    removed, last_pk = 0, 0
+    while True:
+        batch = list(
+            GeneratedDocument.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", "file")[:batch_size]
+        )
+        if not batch:
+            return removed
+        last_pk = batch[-1][0]
+        missing = [pk for pk, name in batch if not name or not os.path.exists(media_path(name))]
+        if missing:
+            removed += _delete_documents(missing, dry_run)
+
+
+def _iter_files(root: Path, older_than: float):
+    """Рекурсивный обход через scandir: каталоги не читаются в память целиком."""
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < older_than:
+                    yield entry.path
+
+
+def delete_orphan_files(batch_size: int = 500, min_age: timedelta = timedelta(hours=1), dry_run: bool = False) -> int:
+    """
+    Удаляет файлы в MEDIA_ROOT/generated, на которые нет строк в БД.
+    Файлы моложе min_age не трогаются: их строки могут быть ещё не закоммичены.
+    """
+    media_root = Path(settings.MEDIA_ROOT)
+    files = _iter_files(media_root / GENERATED_DIR, time.time() - min_age.total_seconds())
+    removed = 0
+    while True:
+        batch = {Path(path).relative_to(media_root).as_posix(): path for path in islice(files, batch_size)}
+        if not batch:
+            return removed
+        for name in batch.keys() - _referenced(batch):
+            if not dry_run:
+                Path(batch[name]).unlink(missing_ok=True)
+            removed += 1
+
+
+def apply_retention(max_age: timedelta | None = None, keep_per_client: int | None = None,
+                    batch_size: int = 500, dry_run: bool = False) -> tuple[int, int]:
+    """
+    Удаляет документы старше max_age и все, кроме keep_per_client последних, у каждого клиента.
+    Возвращает (удалено по возрасту, удалено сверх лимита).
+    """
+    expired = over_limit = 0
+    if max_age:
+        old = GeneratedDocument.objects.filter(created_at__lt=timezone.now() - max_age).order_by("pk")
+        last_pk = 0
+        while True:
+            pks = list(old.filter(pk__gt=last_pk).values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                break
+            last_pk = pks[-1]
+            expired += _delete_documents(pks, dry_run)
+
+    if keep_per_client:
+        crowded = (
+            GeneratedDocument.objects.order_by().values("client")
+            .annotate(n=Count("pk")).filter(n__gt=keep_per_client).values_list("client", flat=True)
+        )
+        for client_id in crowded.iterator():
+            extra = list(
+                GeneratedDocument.objects.filter(client_id=client_id)
+                .order_by("-created_at", "-pk").values_list("pk", flat=True)[keep_per_client:]
+            )
+            for start in range(0, len(extra), batch_size):
+                over_limit += _delete_documents(extra[start:start + batch_size], dry_run)
+    return expired, over_limit
+
+
+def run_gc(max_age: timedelta | None = None, keep_per_client: int | None = None,
+           batch_size: int = 500, dry_run: bool = False) -> GcReport:
+    """
+    Полный проход: политика хранения -> строки без файлов -> файлы без строк -> неиспользуемый кэш рендера.
+    Без явных параметров политика берётся из DOCXGEN_RETENTION_DAYS и DOCXGEN_RETENTION_PER_CLIENT.
+    """
+    if max_age is None:
+        days = getattr(settings, "DOCXGEN_RETENTION_DAYS", 0)
+        max_age = timedelta(days=days) if days > 0 else None
+    if keep_per_client is None:
+        keep_per_client = getattr(settings, "DOCXGEN_RETENTION_PER_CLIENT", 0) or None
+
+    report = GcReport()
+    report.expired, report.over_limit = apply_retention(max_age, keep_per_client, batch_size, dry_run)
+    report.missing_rows = delete_missing_rows(batch_size, dry_run)
+    report.orphan_files = delete_orphan_files(batch_size, dry_run=dry_run)
+    if not dry_run:
+        report.cache_evicted = render_cache.evict_unreferenced(batch_size=batch_size)
+    logger.info("Сборка мусора generated/: %s", report.as_dict())
+    return report
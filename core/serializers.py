@@ -1,13 +1,35 @@
 from rest_framework import serializers
-from .models import Entity, Client, Value, Template, GeneratedDocument
+from django.conf import settings
+from .models import Entity, Client, Value, Template, GeneratedDocument, GenerationJob
 
-class EntitySerializer(serializers.ModelSerializer):
+
+def requested_fields(request) -> set[str] | None:
+    """Поля из ?fields=id,name (только для чтения); None — параметр не задан."""
+    if request is None or request.method not in ("GET", "HEAD"):
+        return None
+    raw = request.query_params.get("fields")
+    if not raw:
+        return None
+    return {f.strip() for f in raw.split(",") if f.strip()}
+
+class SparseFieldsMixin:
+    """?fields=id,name — в ответе только перечисленные поля; неизвестные имена игнорируются."""
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.parent is not None and not isinstance(self.parent, serializers.ListSerializer):
+            return fields  # вложенные сериализаторы не режем
+        wanted = requested_fields(self.context.get("request"))
+        if wanted is None:
+            return fields
+        return {name: field for name, field in fields.items() if name in wanted}
+
+class EntitySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Entity
         fields = ["id", "name", "key", "placeholder"]
         read_only_fields = ["placeholder"]
 
-class ClientSerializer(serializers.ModelSerializer):
+class ClientSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # Новое: атрибуты клиента как словарь
     attributes = serializers.JSONField()
 
@@ -24,17 +46,65 @@ class ValueSerializer(serializers.ModelSerializer):
         model = Value
         fields = ["id", "client", "client_name", "entity", "entity_key", "value"]
 
-class TemplateSerializer(serializers.ModelSerializer):
+class TemplateSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # Нормализованные ключи плейсхолдеров, найденные при загрузке
+    placeholders = serializers.SlugRelatedField(many=True, read_only=True, slug_field="key")
+
     class Meta:
         model = Template
-        fields = ["id", "name", "file", "uploaded_at"]
-        read_only_fields = ["uploaded_at"]
+        fields = ["id", "name", "file", "uploaded_at", "content_hash", "size", "placeholders"]
+        read_only_fields = ["uploaded_at", "content_hash", "size"]
 
-class GeneratedDocumentSerializer(serializers.ModelSerializer):
+class GeneratedDocumentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     client_name = serializers.ReadOnlyField(source="client.name")
     template_name = serializers.ReadOnlyField(source="template.name")
 
     class Meta:
         model = GeneratedDocument
         fields = ["id", "client", "client_name", "template", "template_name", "file", "created_at"]
-        read_only_fields = ["file", "created_at"]
\ No newline at end of file
+        read_only_fields = ["file", "created_at"]
+
+class BatchGenerateSerializer(serializers.Serializer):
+    """
+    Вход пакетной генерации: шаблон + список ID клиентов и/или фильтр по имени.
+    В validated_data["clients"] — queryset клиентов (по pk); лимит — context["max_clients"]
+    или DOCXGEN_BATCH_MAX_CLIENTS.
+    """
+    template = serializers.PrimaryKeyRelatedField(queryset=Template.objects.all())
+    client_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    client_name = serializers.CharField(required=False, allow_blank=False)
+
+    def validate(self, attrs):
+        if "client_ids" not in attrs and "client_name" not in attrs:
+            raise serializers.ValidationError("Укажите client_ids или client_name")
+        clients = Client.objects.all()
+        if "client_ids" in attrs:
+            clients = clients.filter(pk__in=attrs["client_ids"])
+        if "client_name" in attrs:
+            clients = clients.filter(name__icontains=attrs["client_name"])
+        clients = clients.order_by("pk")
+        count = clients.count()
+        if not count:
+            raise serializers.ValidationError("Под условия не попал ни один клиент")
+        limit = self.context.get("max_clients") or getattr(settings, "DOCXGEN_BATCH_MAX_CLIENTS", 5000)
+        if count > limit:
+            raise serializers.ValidationError(f"Слишком много клиентов в одном запросе: {count} > {limit}")
+        attrs["clients"] = clients
+        return attrs
+
+class MergeGenerateSerializer(BatchGenerateSerializer):
+    """Вход слияния (core.merge): как у пакета, плюс values — общие значения для шапок и подвалов."""
+    values = serializers.DictField(child=serializers.CharField(allow_blank=True), required=False, default=dict)
+
+class GenerationJobSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    template_name = serializers.ReadOnlyField(source="template.name")
+    progress = serializers.ReadOnlyField()
+    documents = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta:
+        model = GenerationJob
+        fields = [
+            "id", "template", "template_name", "status", "total", "done", "progress", "error",
+            "documents", "created_at", "started_at", "finished_at",
+        ]
+        read_only_fields = fields
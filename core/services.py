@@ -0,0 +1,85 @@
+"""
+Генерация документов для клиентов: рендер через core.utils + запись GeneratedDocument.
+Файл всегда рендерится до создания строки в БД, поэтому строк «без файла» не бывает.
+При включённом DOCXGEN_RENDER_CACHE одинаковые входы не рендерятся повторно (core.render_cache).
+"""
+from pathlib import Path
+from django.db import transaction
+
+from . import render_cache
+from .metrics import span
+from .models import GeneratedDocument, TemplatePlaceholder
+from .parallel import render_many
+from .storage import media_relative
+from .utils import render_to_buffer, template_cache
+
+
+def _render_files(template, values_list: list[dict]) -> tuple[list[str], list[Path], dict[str, str]]:
+    """
+    Возвращает (имена файлов по порядку values_list, новые файлы, новые записи кэша {ключ: имя}).
+    Одинаковые значения внутри пакета тоже рендерятся один раз.
+    """
+    template_path = template.file.path
+    if not render_cache.enabled():
+        paths = render_many(template_path, values_list)
+        return [media_relative(p) for p in paths], paths, {}
+
+    template_hash = render_cache.file_sha256(template_path)
+    keys = [render_cache.render_key(template_hash, values) for values in values_list]
+    with span("render_cache_lookup"):
+        cached = render_cache.lookup(keys)
+    to_render: dict[str, dict] = {}
+    for key, values in zip(keys, values_list):
+        if key not in cached:
+            to_render.setdefault(key, values)
+
+    paths = render_many(template_path, list(to_render.values()))
+    fresh = {key: media_relative(path) for key, path in zip(to_render, paths)}
+    render_cache.record(hits=len(keys) - len(to_render), misses=len(to_render))
+    return [cached.get(key) or fresh[key] for key in keys], paths, fresh
+
+
+def render_ephemeral(client, template):
+    """Рендер «на один раз»: ни файла в MEDIA_ROOT, ни строки GeneratedDocument. Возвращает поток."""
+    return render_to_buffer(template.file.path, dict(client.attributes or {}))
+
+
+def generate_for_client(client, template) -> GeneratedDocument:
+    return generate_batch(template, [client])[0]
+
+
+def generate_batch(template, clients) -> list[GeneratedDocument]:
+    """
+    Рендерит один шаблон для множества клиентов: шаблон разбирается один раз (кэш core.utils),
+    при DOCXGEN_RENDER_WORKERS > 1 рендер идёт в пуле процессов (core.parallel).
+    Строки GeneratedDocument пишутся одним bulk_create в конце; если запись падает, новые файлы удаляются.
+    """
+    clients = list(clients)
+    names, paths, fresh = _render_files(template, [dict(c.attributes or {}) for c in clients])
+    docs = [GeneratedDocument(client=client, template=template, file=name) for client, name in zip(clients, names)]
+    try:
+        with span("db_write"), transaction.atomic():
+            GeneratedDocument.objects.bulk_create(docs, batch_size=500)
+            render_cache.store(template, fresh)
+    except Exception:
+        for path in paths:
+            Path(path).unlink(missing_ok=True)
+        raise
+    return docs
+
+
+def index_template(template):
+    """
+    Записывает в БД хеш, размер и нормализованные ключи плейсхолдеров шаблона.
+    Разбор идёт через кэш core.utils, так что первый рендер шаблона уже будет «тёплым».
+    """
+    path = Path(template.file.path)
+    keys = template_cache.get(path).keys
+    template.content_hash = render_cache.file_sha256(path)
+    template.size = path.stat().st_size
+    with transaction.atomic():
+        template.save(update_fields=["content_hash", "size"])
+        TemplatePlaceholder.objects.filter(template=template).exclude(key__in=keys).delete()
+        TemplatePlaceholder.objects.bulk_create(
+            [TemplatePlaceholder(template=template, key=key) for key in sorted(keys)], ignore_conflicts=True,
+        )
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import GeneratedDocument
+from .retention import release_files
+
+
+class _ReleaseBatch:
+    """Файлы удалённых в транзакции документов: освобождаются одним release_files после коммита."""
+    def __init__(self):
+        self.names: set[str] = set()
+
+    def __call__(self):
+        release_files(self.names)
+
+
+@receiver(post_delete, sender=GeneratedDocument)
+def release_document_file(sender, instance, using, **kwargs):
+    """
+    Удаление строки (в том числе каскадом от Client) освобождает файл — но только после коммита
+    и только если на файл не ссылаются другие документы или кэш рендера.
+    Имена копятся в одной отложенной функции на транзакцию: удаление N строк — одна проверка
+    ссылок на всю порцию, а не по два запроса на строку.
+    """
+    if not instance.file:
+        return
+    connection = transaction.get_connection(using)
+    batch = getattr(connection, "docxgen_release_batch", None)
+    # Список run_on_commit сбрасывается при коммите и откате: если нашей функции в нём нет — транзакция новая
+    if batch is None or not any(callback is batch for _, callback, _ in connection.run_on_commit):
+        batch = connection.docxgen_release_batch = _ReleaseBatch()
+        batch.names.add(instance.file.name)
+        transaction.on_commit(batch, using=using)
+    else:
+        batch.names.add(instance.file.name)
+
+
+_SQLITE_JOURNAL_MODES = {"wal", "delete", "truncate", "persist", "memory", "off"}
+_SQLITE_SYNCHRONOUS = {"off", "normal", "full", "extra"}
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    """PRAGMA для каждого нового соединения SQLite (см. блок «Соединения с БД» в settings)."""
+    if connection.vendor != "sqlite":
+        return
+    journal_mode = getattr(settings, "SQLITE_JOURNAL_MODE", "wal")
+    synchronous = getattr(settings, "SQLITE_SYNCHRONOUS", "normal")
+    if journal_mode not in _SQLITE_JOURNAL_MODES or synchronous not in _SQLITE_SYNCHRONOUS:
+        raise ValueError(f"Недопустимые SQLITE_JOURNAL_MODE={journal_mode!r} / SQLITE_SYNCHRONOUS={synchronous!r}")
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA busy_timeout = {int(getattr(settings, 'SQLITE_BUSY_TIMEOUT_MS', 10000))}")
+        cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+        cursor.execute(f"PRAGMA synchronous = {synchronous}")
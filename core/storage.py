@@ -0,0 +1,67 @@
+"""
+Раскладка файлов в MEDIA_ROOT по подкаталогам, чтобы в одном каталоге не копились сотни тысяч файлов.
+
+DOCXGEN_STORAGE_LAYOUT:
+— "hash" (по умолчанию): generated/ab/cd/<имя> — два уровня по первым символам хеша имени;
+— "date": generated/2025/01/31/<имя> — по дате создания;
+— "flat": generated/<имя> — как раньше.
+Имена уже сохранённых файлов в БД не меняются сами: перенос — команда reshard_media.
+"""
+import hashlib
+import re
+import uuid
+from datetime import date
+from pathlib import Path
+
+from django.conf import settings
+
+GENERATED_DIR = "generated"
+TEMPLATES_DIR = "templates"
+LAYOUTS = ("hash", "date", "flat")
+
+_HEX_RE = re.compile(r"[0-9a-f]{4}")
+
+
+def layout() -> str:
+    return getattr(settings, "DOCXGEN_STORAGE_LAYOUT", "hash")
+
+
+def shard_name(directory: str, filename: str, on: date | None = None) -> str:
+    """Имя файла в хранилище (относительно MEDIA_ROOT) для текущей раскладки."""
+    filename = Path(filename).name
+    mode = layout()
+    if mode == "flat":
+        return f"{directory}/{filename}"
+    if mode == "date":
+        on = on or date.today()
+        return f"{directory}/{on:%Y/%m/%d}/{filename}"
+    stem = Path(filename).stem.lower()
+    # uuid-имена уже случайны; у остальных (загруженные шаблоны) шардируем по хешу имени
+    digest = stem if _HEX_RE.match(stem) else hashlib.sha1(filename.encode("utf-8")).hexdigest()
+    return f"{directory}/{digest[:2]}/{digest[2:4]}/{filename}"
+
+
+def media_path(name: str) -> Path:
+    """Абсолютный путь к файлу хранилища по его имени (FileField.name)."""
+    return Path(settings.MEDIA_ROOT) / name
+
+
+def media_relative(path) -> str:
+    """Путь файла относительно MEDIA_ROOT — в таком виде он хранится в FileField."""
+    return Path(path).resolve().relative_to(Path(settings.MEDIA_ROOT).resolve()).as_posix()
+
+
+def new_generated_path(suffix: str = ".docx") -> Path:
+    """Путь для нового сгенерированного файла; каталоги создаются."""
+    path = media_path(shard_name(GENERATED_DIR, f"{uuid.uuid4().hex}{suffix}"))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def template_upload_to(instance, filename: str) -> str:
+    """upload_to для Template.file; коллизии имён разрешает само хранилище."""
+    return shard_name(TEMPLATES_DIR, filename)
+
+
+def generated_upload_to(instance, filename: str) -> str:
+    return shard_name(GENERATED_DIR, filename)
@@ -0,0 +1,84 @@
+import io
+import tempfile
+import warnings
+import zipfile
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import AsyncClient, TransactionTestCase, override_settings
+from docx import Document
+
+from core.models import Client, GeneratedDocument, Template
+
+
+def _docx_bytes(*paragraphs) -> bytes:
+    doc = Document()
+    for text in paragraphs:
+        doc.add_paragraph(text)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+class AsyncDownloadTests(TransactionTestCase):
+    # Рендер идёт в потоках core.render_pool: им нужны закоммиченные данные, а не транзакция теста
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name, DOCXGEN_RENDER_CACHE=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client_obj = Client.objects.create(name="Иванов", attributes={"FIO": "Иванов И. И."})
+        self.template = Template(name="Письмо")
+        self.template.file.save("letter.docx", ContentFile(_docx_bytes("Здравствуйте, {FIO}")))
+
+    async def _body(self, response) -> bytes:
+        # Тело — асинхронный итератор: Django под ASGI не станет вычитывать файл целиком
+        self.assertTrue(response.is_async)
+        return b"".join([chunk async for chunk in response.streaming_content])
+
+    async def test_download_streams_asynchronously(self):
+        doc = await GeneratedDocument.objects.acreate(
+            client=self.client_obj, template=self.template, file=ContentFile(b"x" * 200_000, name="doc.docx"),
+        )
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            response = await self.async_client.get(f"/api/async/generated/{doc.pk}/download/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Content-Length"], "200000")
+            self.assertEqual(await self._body(response), b"x" * 200_000)
+
+    async def test_missing_file_is_404(self):
+        doc = await GeneratedDocument.objects.acreate(client=self.client_obj, template=self.template, file="nope.docx")
+        response = await self.async_client.get(f"/api/async/generated/{doc.pk}/download/")
+        self.assertEqual(response.status_code, 404)
+
+    async def test_generate_ephemeral_and_download(self):
+        for mode in ("ephemeral", "download"):
+            with self.subTest(mode=mode):
+                response = await self.async_client.post(
+                    f"/api/async/generate/{self.client_obj.pk}/{self.template.pk}/?{mode}=1",
+                )
+                self.assertEqual(response.status_code, 200)
+                body = await self._body(response)
+                self.assertEqual(int(response["Content-Length"]), len(body))
+                text = [p.text for p in Document(io.BytesIO(body)).paragraphs]
+                self.assertEqual(text, ["Здравствуйте, Иванов И. И."])
+                self.assertIsNone(zipfile.ZipFile(io.BytesIO(body)).testzip())
+
+    async def test_generate_checks_csrf_for_sessions(self):
+        client = AsyncClient(enforce_csrf_checks=True)
+        url = f"/api/async/generate/{self.client_obj.pk}/{self.template.pk}/"
+        self.assertEqual((await client.post(url)).status_code, 201)  # без сессии токен не нужен
+
+        user = await sync_to_async(get_user_model().objects.create_user)("operator", password="secret")
+        await client.aforce_login(user)
+        response = await client.post(url)
+        self.assertEqual(response.status_code, 403)
+        self.assertIn("CSRF", response.json()["detail"])
+
+        token = "a" * 32
+        client.cookies[settings.CSRF_COOKIE_NAME] = token
+        self.assertEqual((await client.post(url, headers={"X-CSRFToken": token})).status_code, 201)
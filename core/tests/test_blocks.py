@@ -0,0 +1,169 @@
+import io
+import struct
+import tempfile
+import zlib
+from pathlib import Path
+
+from django.test import SimpleTestCase, override_settings
+from docx import Document
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+
+from core.utils import _render_to, template_cache
+
+ENGINES = ("docx", "xml")
+
+
+def _png() -> io.BytesIO:
+    """PNG 1×1 — для рисунка в шаблоне."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    header = struct.pack(">2I5B", 1, 1, 8, 2, 0, 0, 0)
+    return io.BytesIO(b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+                      + chunk(b"IDAT", zlib.compress(b"\x00\xff\xff\xff")) + chunk(b"IEND", b""))
+
+
+class BlocksTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+    def _template(self, build) -> Path:
+        path = self.dir / f"{build.__name__}.docx"
+        doc = Document()
+        build(doc)
+        doc.save(path)
+        return path
+
+    def _render(self, path, values, engine):
+        buffer = io.BytesIO()
+        with override_settings(DOCXGEN_RENDER_ENGINE=engine):
+            _render_to(path, values, buffer, "—")
+        buffer.seek(0)
+        return Document(buffer)
+
+    def test_rows_between_marker_rows(self):
+        # {#ROWS} и {/ROWS} — в отдельных строках таблицы, сами эти строки не повторяются
+        def invoice(doc):
+            table = doc.add_table(rows=5, cols=2)
+            table.rows[0].cells[0].text = "Товар"
+            table.rows[0].cells[1].text = "Цена"
+            table.rows[1].cells[0].text = "{#ROWS}"
+            table.rows[2].cells[0].text = "{NAME}"
+            table.rows[2].cells[1].text = "{PRICE}"
+            table.rows[3].cells[0].text = "{/ROWS}"
+            table.rows[4].cells[0].text = "Итого: {TOTAL}"
+
+        path = self._template(invoice)
+        values = {"TOTAL": "3", "ROWS": [{"name": "a", "price": 1}, {"name": "b", "price": 2}]}
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                rows = [[c.text for c in row.cells] for row in self._render(path, values, engine).tables[0].rows]
+                self.assertEqual(rows, [["Товар", "Цена"], ["a", "1"], ["b", "2"], ["Итого: 3", ""]])
+
+    def test_row_with_markers_in_cells(self):
+        def invoice(doc):
+            table = doc.add_table(rows=1, cols=2)
+            table.rows[0].cells[0].text = "{#ITEMS}{NAME}"
+            table.rows[0].cells[1].text = "{PRICE}{/ITEMS}"
+
+        path = self._template(invoice)
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                doc = self._render(path, {"ITEMS": [{"NAME": "a", "PRICE": 1}, {"NAME": "b", "PRICE": 2}]}, engine)
+                self.assertEqual([[c.text for c in row.cells] for row in doc.tables[0].rows], [["a", "1"], ["b", "2"]])
+                doc = self._render(path, {"ITEMS": []}, engine)
+                self.assertEqual(len(doc.tables[0].rows), 0)
+
+    def test_paragraph_blocks(self):
+        def letter(doc):
+            doc.add_paragraph("Клиент {FIO}")
+            doc.add_paragraph("{#VIP}")
+            doc.add_paragraph("Уважаемый VIP-клиент {FIO}!")
+            doc.add_paragraph("{/VIP}")
+            doc.add_paragraph("{^DISCOUNT}")
+            doc.add_paragraph("Скидки нет")
+            doc.add_paragraph("{/DISCOUNT}")
+            doc.add_paragraph("{#GROUPS}")
+            doc.add_paragraph("Группа {TITLE}:")
+            doc.add_paragraph("{#MEMBERS}")
+            doc.add_paragraph("— {.} ({TITLE})")
+            doc.add_paragraph("{/MEMBERS}")
+            doc.add_paragraph("{/GROUPS}")
+
+        path = self._template(letter)
+        values = {"FIO": "Иванов", "VIP": "да", "GROUPS": [{"TITLE": "G1", "MEMBERS": ["x", "y"]}, {"TITLE": "G2"}]}
+        expected = ["Клиент Иванов", "Уважаемый VIP-клиент Иванов!", "Скидки нет",
+                    "Группа G1:", "— x (G1)", "— y (G1)", "Группа G2:"]
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                self.assertEqual([p.text for p in self._render(path, values, engine).paragraphs], expected)
+                doc = self._render(path, {"FIO": "Петров", "DISCOUNT": "5%"}, engine)
+                self.assertEqual([p.text for p in doc.paragraphs], ["Клиент Петров"])
+
+    def test_empty_block_leaves_paragraph_in_cell(self):
+        def cell(doc):
+            table = doc.add_table(rows=1, cols=2)
+            table.rows[0].cells[0].text = "{#ITEMS}"
+            table.rows[0].cells[0].add_paragraph("{.}")
+            table.rows[0].cells[0].add_paragraph("{/ITEMS}")
+            table.rows[0].cells[1].text = "{FIO}"
+
+        path = self._template(cell)
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                doc = self._render(path, {"FIO": "Иванов", "ITEMS": []}, engine)
+                # Ячейка без w:p — повреждённый для Word файл
+                self.assertEqual(len(doc.tables[0].rows[0].cells[0].paragraphs), 1)
+                self.assertEqual([c.text for c in doc.tables[0].rows[0].cells], ["", "Иванов"])
+                doc = self._render(path, {"ITEMS": ["a", "b"]}, engine)
+                self.assertEqual([p.text for p in doc.tables[0].rows[0].cells[0].paragraphs], ["a", "b"])
+
+    def test_repeated_pictures_and_bookmarks_get_unique_ids(self):
+        def gallery(doc):
+            doc.add_paragraph().add_run().add_picture(_png())
+            doc.add_paragraph("{#ITEMS}")
+            p = doc.add_paragraph()
+            start, end = OxmlElement("w:bookmarkStart"), OxmlElement("w:bookmarkEnd")
+            start.set(qn("w:id"), "0")
+            start.set(qn("w:name"), "item")
+            end.set(qn("w:id"), "0")
+            p._p.append(start)
+            p.add_run("{.}").add_picture(_png())
+            p._p.append(end)
+            doc.add_paragraph("{/ITEMS}")
+
+        path = self._template(gallery)
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                body = self._render(path, {"ITEMS": ["a", "b", "c"]}, engine).element.body
+                pictures = [el.get("id") for el in body.iter(qn("wp:docPr"))]
+                self.assertEqual(len(pictures), 4)
+                self.assertEqual(len(set(pictures)), 4)
+                starts = [el.get(qn("w:id")) for el in body.iter(qn("w:bookmarkStart"))]
+                ends = [el.get(qn("w:id")) for el in body.iter(qn("w:bookmarkEnd"))]
+                self.assertEqual(len(set(starts)), 3)
+                self.assertEqual(starts, ends)
+
+    def test_list_in_scalar_placeholder(self):
+        def summary(doc):
+            doc.add_paragraph("Теги: {TAGS}")
+
+        path = self._template(summary)
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                doc = self._render(path, {"TAGS": ["a", "b", 3]}, engine)
+                self.assertEqual(doc.paragraphs[0].text, "Теги: a, b, 3")
+
+    def test_keys_exclude_blocks(self):
+        def invoice(doc):
+            doc.add_paragraph("Клиент {FIO}")
+            doc.add_paragraph("{#ITEMS}")
+            doc.add_paragraph("{NAME}: {PRICE}")
+            doc.add_paragraph("{/ITEMS}")
+            doc.add_paragraph("{^VIP}Обычный клиент{/VIP}")
+
+        # Ключи блоков и плейсхолдеры внутри них — не атрибуты клиента; маркеры внутри
+        # одного абзаца блоком не считаются и остаются текстом, но тоже не ключи
+        self.assertEqual(template_cache.get(self._template(invoice)).keys, {"fio"})
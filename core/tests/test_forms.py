@@ -0,0 +1,29 @@
+from django.test import TestCase
+
+from core.admin import ClientAdminForm
+from core.forms import ClientAttributesForm
+from core.models import Client, Entity
+
+
+class ListAttributesTests(TestCase):
+    def setUp(self):
+        Entity.objects.create(name="ФИО", key="FIO")
+        Entity.objects.create(name="Товары", key="ITEMS")
+        self.items = [{"NAME": "a", "PRICE": 1}, {"NAME": "b", "PRICE": 2}]
+        self.client_obj = Client.objects.create(name="Иванов", attributes={"FIO": "Иванов", "ITEMS": self.items})
+
+    def test_attributes_form_keeps_lists(self):
+        form = ClientAttributesForm({"FIO": "Петров"}, client=self.client_obj)
+        self.assertNotIn("ITEMS", form.fields)
+        self.assertTrue(form.is_valid())
+        form.save()
+        self.client_obj.refresh_from_db()
+        self.assertEqual(self.client_obj.attributes, {"FIO": "Петров", "ITEMS": self.items})
+
+    def test_admin_form_keeps_lists(self):
+        form = ClientAdminForm({"name": "Иванов", "notes": "", "attr__FIO": "Петров"}, instance=self.client_obj)
+        self.assertNotIn("attr__ITEMS", form.fields)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.client_obj.refresh_from_db()
+        self.assertEqual(self.client_obj.attributes, {"FIO": "Петров", "ITEMS": self.items})
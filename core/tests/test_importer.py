@@ -0,0 +1,27 @@
+import io
+
+from django.test import TestCase
+
+from core.importer import import_clients
+from core.models import Client, Entity
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        for key in ("FIO", "ADDR"):
+            Entity.objects.create(name=key, key=key)
+        self.client_obj = Client.objects.create(name="Иванов", attributes={"FIO": "Иванов И.", "ADDR": "Msk"})
+
+    def _import(self, text: str, **kwargs):
+        return import_clients(io.BytesIO(text.encode()), "csv", **kwargs)
+
+    def test_empty_cells_keep_values(self):
+        self._import("name,FIO,ADDR\nИванов,Иванов И. И.,\nПетров,,Spb\n")
+        self.client_obj.refresh_from_db()
+        self.assertEqual(self.client_obj.attributes, {"FIO": "Иванов И. И.", "ADDR": "Msk"})
+        self.assertEqual(Client.objects.get(name="Петров").attributes, {"ADDR": "Spb"})
+
+    def test_replace_writes_empty_cells(self):
+        self._import("name,FIO,ADDR\nИванов,Иванов И. И.,\n", replace=True)
+        self.client_obj.refresh_from_db()
+        self.assertEqual(self.client_obj.attributes, {"FIO": "Иванов И. И.", "ADDR": ""})
@@ -0,0 +1,43 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from core import jobs
+from core.models import Client, GeneratedDocument, GenerationJob, Template
+
+
+class RunJobTests(TestCase):
+    def setUp(self):
+        self.template = Template.objects.create(name="Шаблон", file="templates/t.docx")
+        self.clients = [Client.objects.create(name=f"Клиент {i}") for i in range(4)]
+        ids = [c.pk for c in self.clients]
+        self.job = GenerationJob.objects.create(template=self.template, client_ids=ids, total=len(ids))
+
+    def _batch(self, template, clients):
+        return [GeneratedDocument.objects.create(client=c, template=template, file="generated/x.docx") for c in clients]
+
+    def test_job_done(self):
+        job = jobs.claim_next_job("w1")
+        with mock.patch("core.jobs.generate_batch", side_effect=self._batch):
+            jobs.run_job(job, chunk_size=2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.Status.DONE)
+        self.assertEqual(job.done, 4)
+        self.assertEqual(job.documents.count(), 4)
+
+    def test_requeued_job_not_overwritten(self):
+        job = jobs.claim_next_job("w1")
+
+        def takeover(template, clients):
+            # Пока w1 рендерит, задание вернули в очередь и забрал w2
+            GenerationJob.objects.filter(pk=job.pk).update(worker="w2", started_at=timezone.now())
+            return self._batch(template, clients)
+
+        with mock.patch("core.jobs.generate_batch", side_effect=takeover):
+            jobs.run_job(job, chunk_size=2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.Status.RUNNING)
+        self.assertEqual(job.worker, "w2")
+        self.assertEqual(job.done, 0)
+        self.assertEqual(job.documents.count(), 0)
@@ -0,0 +1,82 @@
+import io
+import tempfile
+import zipfile
+from pathlib import Path
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from docx import Document
+from docx.oxml.ns import qn
+
+from core.merge import iter_merged
+from core.models import Client, Template
+
+
+def _template(path=None):
+    doc = Document()
+    doc.sections[0].header.paragraphs[0].text = "Отдел {DEPT}"
+    p = doc.add_paragraph("Клиент ")
+    p.add_run("{FIO}").bold = True
+    doc.add_paragraph("Адрес: {ADDRESS}")
+    buffer = io.BytesIO()
+    doc.save(path or buffer)
+    return buffer.getvalue()
+
+
+class MergeTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.dir = Path(media.name)
+
+    def test_merged_document(self):
+        path = self.dir / "merge.docx"
+        _template(path)
+        values = [{"FIO": f"Клиент {i}", "ADDRESS": f"ул. {i}"} for i in range(50)]
+        data = b"".join(iter_merged(path, iter(values), {"DEPT": "продаж"}))
+
+        with zipfile.ZipFile(io.BytesIO(data)) as result, zipfile.ZipFile(path) as source:
+            self.assertIsNone(result.testzip())
+            self.assertEqual(result.namelist(), source.namelist())
+        doc = Document(io.BytesIO(data))
+        expected = []
+        for i, item in enumerate(values):
+            expected += ([""] if i else []) + [f"Клиент {item['FIO']}", f"Адрес: {item['ADDRESS']}"]
+        self.assertEqual([p.text for p in doc.paragraphs], expected)
+        self.assertTrue(all(p.runs[1].bold for p in doc.paragraphs if p.text.startswith("Клиент")))
+        # Записи разделены разрывами раздела; шапка общая, из shared_values
+        self.assertEqual(len(doc.element.body.findall(f".//{qn('w:sectPr')}")), 50)
+        self.assertEqual(doc.sections[0].header.paragraphs[0].text, "Отдел продаж")
+
+    def test_merge_endpoint(self):
+        template = Template(name="Письмо")
+        template.file.save("letter.docx", ContentFile(_template()))
+        clients = [Client.objects.create(name=f"К{i}", attributes={"FIO": f"Иванов {i}"}) for i in range(3)]
+        response = self.client.post(
+            "/api/generate/merge/",
+            {"template": template.pk, "client_ids": [c.pk for c in clients], "values": {"DEPT": "кадров"}},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        doc = Document(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual([p.text for p in doc.paragraphs if p.text.startswith("Клиент")],
+                         ["Клиент Иванов 0", "Клиент Иванов 1", "Клиент Иванов 2"])
+        self.assertEqual(doc.sections[0].header.paragraphs[0].text, "Отдел кадров")
+
+    def test_blocks_in_records(self):
+        path = self.dir / "blocks.docx"
+        doc = Document()
+        doc.add_paragraph("Клиент {FIO}")
+        doc.add_paragraph("{#ITEMS}")
+        doc.add_paragraph("— {.}")
+        doc.add_paragraph("{/ITEMS}")
+        doc.save(path)
+        values = [{"FIO": f"К{i}", "ITEMS": [str(i)] * (i % 3)} for i in range(5)]
+        doc = Document(io.BytesIO(b"".join(iter_merged(path, iter(values)))))
+        expected = []
+        for i, item in enumerate(values):
+            expected += ([""] if i else []) + [f"Клиент {item['FIO']}"] + [f"— {v}" for v in item["ITEMS"]]
+        self.assertEqual([p.text for p in doc.paragraphs], expected)
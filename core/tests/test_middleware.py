@@ -0,0 +1,29 @@
+import tempfile
+from pathlib import Path
+
+from django.test import TestCase, override_settings
+
+from core import middleware
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        settings_override = override_settings(
+            DOCXGEN_METRICS=True, DOCXGEN_PROFILE_SAMPLE_RATE=1.0, DOCXGEN_PROFILER="cprofile",
+            DOCXGEN_PROFILE_DIR=tmp.name,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_one_profiler_at_a_time(self):
+        # Пока профилировщик занят другим потоком, запрос выполняется без профиля
+        with middleware._profile_lock:
+            self.assertEqual(self.client.get("/api/entities/").status_code, 200)
+        self.assertEqual(list(self.dir.iterdir()), [])
+
+        self.assertEqual(self.client.get("/api/entities/").status_code, 200)
+        self.assertEqual([p.suffix for p in self.dir.iterdir()], [".prof"])
+        self.assertFalse(middleware._profile_lock.locked())
@@ -0,0 +1,33 @@
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from core import parallel
+
+
+class RenderCleanupTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+
+    def _generate(self, template_path, values, default_placeholder):
+        if values.get("FAIL"):
+            raise ValueError("битые значения")
+        path = self.tmp / f"{values['N']}.docx"
+        path.write_bytes(b"")
+        return path
+
+    @override_settings(DOCXGEN_RENDER_WORKERS=0)
+    def test_failed_render_removes_written_files(self):
+        values_list = [{"N": 1}, {"N": 2}, {"FAIL": True}]
+        with mock.patch("core.parallel.generate_document", side_effect=self._generate):
+            with self.assertRaises(ValueError):
+                parallel.render_many("t.docx", values_list)
+        self.assertEqual(list(self.tmp.iterdir()), [])
+
+    def test_failed_chunk_removes_written_files(self):
+        with mock.patch("core.parallel.generate_document", side_effect=self._generate):
+            with self.assertRaises(ValueError):
+                parallel._render_chunk("t.docx", [{"N": 1}, {"FAIL": True}], "—")
+        self.assertEqual(list(self.tmp.iterdir()), [])
@@ -0,0 +1,71 @@
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase, override_settings
+from docx import Document
+
+from core.utils import generate_document
+
+ENGINES = ("docx", "xml")
+
+
+class ReplaceInRunsTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "template.docx"
+        settings_override = override_settings(MEDIA_ROOT=tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _render(self, doc, values, engine="docx"):
+        doc.save(self.path)
+        with override_settings(DOCXGEN_RENDER_ENGINE=engine):
+            return Document(generate_document(str(self.path), values))
+
+    def test_token_split_across_runs_keeps_formatting(self):
+        doc = Document()
+        p = doc.add_paragraph()
+        p.add_run("Клиент: ").bold = True
+        p.add_run("{Ф")
+        p.add_run("И").italic = True
+        p.add_run("О}")
+        p.add_run(", город ").underline = True
+        p.add_run("{ город }")
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                runs = self._render(doc, {"ФИО": "Иванов", "Город": "Москва"}, engine).paragraphs[0].runs
+                self.assertEqual([r.text for r in runs], ["Клиент: ", "Иванов", "", "", ", город ", "Москва"])
+                self.assertTrue(runs[0].bold)
+                self.assertTrue(runs[4].underline)
+
+    def test_missing_value_and_special_characters(self):
+        doc = Document()
+        doc.add_paragraph("{FIO} / {NOTE} / {UNKNOWN}")
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                p = self._render(doc, {"fio": "A&B <C>", "NOTE": "строка 1\nстрока 2"}, engine).paragraphs[0]
+                self.assertEqual(p.text, "A&B <C> / строка 1\nстрока 2 / —")
+
+    def test_fallback_when_token_spans_tab(self):
+        # Внутри токена w:tab — сопоставить токен с w:t нельзя, абзац пересобирается целиком
+        doc = Document()
+        p = doc.add_paragraph()
+        p.add_run("Клиент {FI")
+        p.add_run().add_tab()
+        p.add_run("O}!")
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                self.assertEqual(self._render(doc, {"FIO": "Иванов"}, engine).paragraphs[0].text, "Клиент Иванов!")
+
+    def test_tables_headers_and_footers(self):
+        doc = Document()
+        doc.sections[0].header.paragraphs[0].text = "Шапка {FIO}"
+        doc.sections[0].footer.paragraphs[0].text = "Подвал {FIO}"
+        doc.add_table(rows=1, cols=1).rows[0].cells[0].text = "Ячейка {FIO}"
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                result = self._render(doc, {"FIO": "Иванов"}, engine)
+                self.assertEqual(result.sections[0].header.paragraphs[0].text, "Шапка Иванов")
+                self.assertEqual(result.sections[0].footer.paragraphs[0].text, "Подвал Иванов")
+                self.assertEqual(result.tables[0].rows[0].cells[0].text, "Ячейка Иванов")
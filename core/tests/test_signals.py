@@ -0,0 +1,66 @@
+import tempfile
+from pathlib import Path
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from core.models import Client, GeneratedDocument, Template
+
+
+class ReleaseFilesTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media = Path(media.name)
+        self.template = Template.objects.create(name="Письмо", file="templates/letter.docx")
+        self.client_obj = Client.objects.create(name="Иванов")
+
+    def _documents(self, n: int) -> list[GeneratedDocument]:
+        return [
+            GeneratedDocument.objects.create(
+                client=self.client_obj, template=self.template, file=ContentFile(b"x", name=f"doc{i}.docx"),
+            )
+            for i in range(n)
+        ]
+
+    def test_batch_delete_releases_files_once(self):
+        docs = self._documents(20)
+        with self.captureOnCommitCallbacks() as callbacks:
+            GeneratedDocument.objects.filter(pk__in=[doc.pk for doc in docs]).delete()
+        self.assertEqual(len(callbacks), 1)
+        # Одна проверка ссылок на всю порцию (два запроса), а не по два на строку
+        with self.assertNumQueries(2):
+            callbacks[0]()
+        self.assertFalse(any((self.media / doc.file.name).exists() for doc in docs))
+
+    def test_client_cascade(self):
+        docs = self._documents(5)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client_obj.delete()
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(any((self.media / doc.file.name).exists() for doc in docs))
+
+    def test_shared_file_is_kept(self):
+        doc, = self._documents(1)
+        GeneratedDocument.objects.create(client=self.client_obj, template=self.template, file=doc.file.name)
+        with self.captureOnCommitCallbacks(execute=True):
+            doc.delete()
+        self.assertTrue((self.media / doc.file.name).exists())
+
+    def test_new_batch_after_rollback(self):
+        first, second = self._documents(2)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    first.delete()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            second.delete()
+        self.assertEqual(len(callbacks), 1)
+        self.assertTrue((self.media / first.file.name).exists())
+        self.assertFalse((self.media / second.file.name).exists())
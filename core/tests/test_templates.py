@@ -0,0 +1,48 @@
+import io
+import zipfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from docx import Document
+
+from core.models import Template
+
+
+def _docx() -> bytes:
+    buf = io.BytesIO()
+    doc = Document()
+    doc.add_paragraph("{FIO}")
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def _broken_docx() -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("word/document.xml", "не xml")
+    return buf.getvalue()
+
+
+class TemplateUploadTests(TestCase):
+    def _upload(self, content: bytes):
+        upload = SimpleUploadedFile("t.docx", content)
+        return self.client.post("/api/templates/", {"name": "Шаблон", "file": upload})
+
+    def test_unparsable_docx_rejected(self):
+        response = self._upload(_broken_docx())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("file", response.json())
+        self.assertFalse(Template.objects.exists())
+
+    def test_index_failure_rolls_back(self):
+        with mock.patch("core.views.index_template", side_effect=ValueError("boom")):
+            with self.assertRaises(ValueError):
+                self._upload(_docx())
+        self.assertFalse(Template.objects.exists())
+
+    def test_upload_indexes(self):
+        response = self._upload(_docx())
+        self.assertEqual(response.status_code, 201, response.content)
+        template = Template.objects.get()
+        self.assertTrue(template.content_hash)
@@ -0,0 +1,71 @@
+import io
+import tempfile
+import zipfile
+from pathlib import Path
+
+from django.test import SimpleTestCase
+from docx import Document
+
+from core.xml_engine import _RawZipWriter, compare_engines, render_xml, xml_template_cache
+
+
+class XmlEngineTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "template.docx"
+        doc = Document()
+        doc.sections[0].header.paragraphs[0].text = "Шапка {FIO}"
+        p = doc.add_paragraph()
+        p.add_run("Клиент {F")
+        p.add_run("IO}").bold = True
+        doc.add_paragraph("Без плейсхолдеров")
+        doc.add_table(rows=1, cols=2).rows[0].cells[1].text = "{ADDRESS} {UNKNOWN}"
+        doc.save(self.path)
+
+    def test_engines_match(self):
+        self.assertEqual(compare_engines(self.path, {"FIO": "Иванов", "address": "Москва"}), [])
+
+    def test_output_is_valid_zip(self):
+        buffer = io.BytesIO()
+        render_xml(xml_template_cache.get(self.path), {"FIO": "Иванов"}, buffer)
+        buffer.seek(0)
+        with zipfile.ZipFile(buffer) as result, zipfile.ZipFile(self.path) as source:
+            self.assertIsNone(result.testzip())
+            self.assertEqual(result.namelist(), source.namelist())
+            # Части без плейсхолдеров скопированы байт-в-байт
+            self.assertEqual(result.read("word/styles.xml"), source.read("word/styles.xml"))
+        buffer.seek(0)
+        self.assertEqual(Document(buffer).paragraphs[0].text, "Клиент Иванов")
+
+    def test_raw_writer(self):
+        buffer = io.BytesIO()
+        writer = _RawZipWriter(buffer)
+        with open(self.path, "rb") as src, zipfile.ZipFile(self.path) as source:
+            first, second = source.infolist()[:2]
+            expected = source.read(first.filename)
+            writer.copy_raw(src, first)
+            writer.write_bytes(second, "Данные".encode())
+        writer.close()
+        buffer.seek(0)
+        with zipfile.ZipFile(buffer) as result:
+            self.assertIsNone(result.testzip())
+            self.assertEqual(result.namelist(), [first.filename, second.filename])
+            self.assertEqual(result.read(first.filename), expected)
+            self.assertEqual(result.read(second.filename), "Данные".encode())
+
+    def test_raw_writer_stream(self):
+        buffer = io.BytesIO()
+        writer = _RawZipWriter(buffer)
+        member = writer.open_stream(zipfile.ZipInfo("stream.xml", date_time=(2024, 1, 2, 3, 4, 6)))
+        for i in range(1000):
+            member.write(f"<row>{i}</row>".encode())
+        member.close()
+        writer.write_bytes(zipfile.ZipInfo("after.xml"), b"<after/>")
+        writer.close()
+        buffer.seek(0)
+        with zipfile.ZipFile(buffer) as result:
+            self.assertIsNone(result.testzip())
+            self.assertEqual(result.read("stream.xml"), b"".join(f"<row>{i}</row>".encode() for i in range(1000)))
+            self.assertEqual(result.getinfo("stream.xml").date_time, (2024, 1, 2, 3, 4, 6))
+            self.assertEqual(result.read("after.xml"), b"<after/>")
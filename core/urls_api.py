@@ -2,8 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     EntityViewSet, ClientViewSet,
-    TemplateViewSet, GeneratedDocumentViewSet,
-    api_generate,
+    TemplateViewSet, GeneratedDocumentViewSet, GenerationJobViewSet,
+    api_generate, api_generate_batch, api_generate_merge, api_generate_async, download_document_async,
 )
 
 router = DefaultRouter()
@@ -11,8 +11,14 @@ router.register(r"entities", EntityViewSet)
 router.register(r"clients", ClientViewSet)
 router.register(r"templates", TemplateViewSet)
 router.register(r"generated", GeneratedDocumentViewSet, basename="generated")
+router.register(r"jobs", GenerationJobViewSet)
 
 urlpatterns = [
     path("", include(router.urls)),
+    path("generate/batch/", api_generate_batch, name="api_generate_batch"),
+    path("generate/merge/", api_generate_merge, name="api_generate_merge"),
     path("generate/<int:client_id>/<int:template_id>/", api_generate, name="api_generate"),
+    # ASGI: рендер в ограниченном пуле, 429 + Retry-After при перегрузке (core.render_pool)
+    path("async/generate/<int:client_id>/<int:template_id>/", api_generate_async, name="api_generate_async"),
+    path("async/generated/<int:pk>/download/", download_document_async, name="api_download_async"),
 ]
\ No newline at end of file
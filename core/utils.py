@@ -1,46 +1,363 @@
+import copy
 import re
-import uuid
+import tempfile
+import threading
+import time
+import zipfile
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+from itertools import count
 from pathlib import Path
 from docx import Document
+from docx.opc.constants import CONTENT_TYPE as CT
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
 from django.conf import settings
+from django.core.exceptions import ValidationError
+
+from .metrics import render_seconds, span
+from .storage import new_generated_path
 
 # Находим ЛЮБОЕ содержимое в { ... }, кроме вложенных фигурных скобок
 TOKEN_RE = re.compile(r"\{([^{}]+)\}")
 
+# Первый символ ключа у маркеров блоков {#KEY} {^KEY} {/KEY} (core.blocks); как скалярные не подставляются
+_BLOCK_SIGILS = ("#", "^", "/")
+
+# id рисунков и закладок: в копиях блоков и записях слияния перенумеровываются (_renumber)
+_DOC_PR = qn("wp:docPr")
+_BOOKMARKS = (qn("w:bookmarkStart"), qn("w:bookmarkEnd"))
+
+# Кроме основного тела плейсхолдеры ищем в шапках и подвалах
+_STORY_CONTENT_TYPES = (CT.WML_HEADER, CT.WML_FOOTER)
+
 def _norm(s: str) -> str:
     """Нормализация ключа: убрать все пробелы и привести к нижнему регистру."""
     return re.sub(r"\s+", "", str(s)).lower()
 
-def _collect_tokens_from_paragraphs(paragraphs) -> set[str]:
-    tokens = set()
-    for p in paragraphs:
-        for m in TOKEN_RE.finditer(p.text or ""):
-            tokens.add(m.group(0))  # целиком: '{...}'
-    return tokens
-
-def _collect_tokens_from_tables(tables) -> set[str]:
-    tokens = set()
-    for table in tables:
-        for row in table.rows:
-            for cell in row.cells:
-                tokens |= _collect_tokens_from_paragraphs(cell.paragraphs)
-    return tokens
-
-def _replace_in_paragraphs(paragraphs, mapping_exact: dict[str, str]):
+def _as_text(value) -> str:
+    """Значение для плейсхолдера: у списков и словарей — элементы через запятую, а не repr."""
+    if isinstance(value, (list, tuple)):
+        return ", ".join(_as_text(item) for item in value)
+    if isinstance(value, dict):
+        return ", ".join(_as_text(item) for item in value.values())
+    return str(value)
+
+def validate_docx(file):
+    """
+    Валидатор FileField: загруженный файл должен быть .docx (zip с word/document.xml),
+    который разбирает python-docx — иначе шаблон не удастся проиндексировать и отрендерить.
+    """
+    try:
+        file.seek(0)
+        with zipfile.ZipFile(file) as zf:
+            ok = "word/document.xml" in zf.namelist()
+    except (zipfile.BadZipFile, OSError):
+        ok = False
+    finally:
+        file.seek(0)
+    if not ok:
+        raise ValidationError("Файл не похож на документ .docx")
+    try:
+        Document(file)
+    except Exception as exc:  # python-docx и lxml бросают разные исключения на битых пакетах
+        raise ValidationError(f"Не удалось разобрать документ .docx: {exc}")
+    finally:
+        file.seek(0)
+
+def _story_parts(doc) -> list:
+    """Части пакета с текстом: document.xml + все header*/footer*.xml."""
+    parts = [doc.part]
+    for part in doc.part.package.iter_parts():
+        if part.content_type in _STORY_CONTENT_TYPES:
+            parts.append(part)
+    return parts
+
+def _element_path(root, el, index_cache: dict) -> tuple[int, ...]:
+    """Путь от корня части до элемента в виде индексов детей: (3, 0, 5, ...)."""
+    path = []
+    while el is not root:
+        parent = el.getparent()
+        positions = index_cache.get(parent)
+        if positions is None:
+            positions = index_cache[parent] = {child: i for i, child in enumerate(parent)}
+        path.append(positions[el])
+        el = parent
+    return tuple(reversed(path))
+
+def _resolve_path(root, path: tuple[int, ...]):
+    el = root
+    for i in path:
+        el = el[i]
+    return el
+
+def _max_id(root) -> int:
+    """Наибольший числовой id рисунков (wp:docPr) и закладок в части."""
+    ids = [el.get("id") for el in root.iter(_DOC_PR)] + [el.get(qn("w:id")) for el in root.iter(*_BOOKMARKS)]
+    return max((int(i) for i in ids if i and i.isdigit()), default=0)
+
+def _renumber(elements: Iterable, ids: Iterator[int]):
+    """
+    Новые id рисунков и закладок в elements из ids: у копий они повторялись бы, а Word требует
+    уникальных. Начало и конец одной закладки получают один и тот же id.
+    """
+    bookmarks: dict[str, str] = {}
+    for element in elements:
+        for el in element.iter(_DOC_PR, *_BOOKMARKS):
+            if el.tag == _DOC_PR:
+                el.set("id", str(next(ids)))
+                continue
+            old = el.get(qn("w:id"))
+            new = bookmarks.get(old)
+            if new is None:
+                new = bookmarks[old] = str(next(ids))
+            el.set(qn("w:id"), new)
+
+def _scan_part(partname: str, root) -> list[tuple[str, tuple[int, ...], frozenset[str]]]:
+    """Находит в части абзацы с токенами '{...}': [(partname, path, tokens)]."""
+    slots = []
+    index_cache: dict = {}
+    for p in root.iter(qn("w:p")):
+        tokens = frozenset(m.group(0) for m in TOKEN_RE.finditer(p.text or ""))
+        if tokens:
+            slots.append((partname, _element_path(root, p, index_cache), tokens))
+    return slots
+
+
+class CompiledTemplate:
+    """
+    Шаблон, разобранный один раз:
+    — document: документ-прототип (не изменяется, рендер работает с его копией);
+    — slots: [(partname, path, tokens)] — где лежат абзацы с плейсхолдерами
+      и какие токены '{...}' в каждом из них;
+    — size: примерный объём в памяти (распакованный размер пакета), для лимита кэша;
+    — blocks: [(partname, path, Block)] — якоря повторяющихся и условных блоков (core.blocks);
+    — first_id: первый свободный id для рисунков и закладок в копиях блоков.
+    """
+    def __init__(self, document, slots: list[tuple[str, tuple[int, ...], frozenset[str]]], size: int,
+                 blocks: list | None = None, first_id: int = 1):
+        self.document = document
+        self.slots = slots
+        self.size = size
+        self.blocks = blocks or []
+        self.first_id = first_id
+        self.tokens: frozenset[str] = frozenset().union(*(tokens for _, _, tokens in slots))
+
+    @property
+    def keys(self) -> set[str]:
+        """
+        Нормализованные ключи плейсхолдеров вне блоков — то, что должно быть в атрибутах клиента.
+        Ключи блоков (пустое значение — законное состояние) и плейсхолдеры внутри блоков
+        (могут браться из элемента списка) сюда не входят.
+        """
+        keys = {_norm(token[1:-1]) for token in self.tokens}
+        return {key for key in keys if key[:1] not in _BLOCK_SIGILS}
+
+
+def compile_template(template_path) -> CompiledTemplate:
+    """Открывает .docx, вырезает блоки в прототипы и один раз находит все абзацы с токенами '{...}'."""
+    from .blocks import compile_blocks
+
+    with span("template_parse"):
+        doc = Document(template_path)
+    slots, blocks, max_id = [], [], 0
+    with span("token_scan"):
+        for part in _story_parts(doc):
+            max_id = max(max_id, _max_id(part.element))
+            blocks += compile_blocks(str(part.partname), part.element)
+            slots += _scan_part(str(part.partname), part.element)
+    with zipfile.ZipFile(template_path) as zf:
+        size = sum(info.file_size for info in zf.infolist())
+    return CompiledTemplate(doc, slots, size, blocks, max_id + 1)
+
+
+class TemplateCache:
+    """
+    LRU-кэш скомпилированных шаблонов.
+    Ключ — путь к файлу; запись считается устаревшей, если изменились mtime или размер.
+    Ограничения (число записей и суммарный объём) берутся из настроек:
+    DOCXGEN_TEMPLATE_CACHE_SIZE и DOCXGEN_TEMPLATE_CACHE_MAX_BYTES.
+    """
+    def __init__(self, loader=compile_template):
+        self._loader = loader
+        self._entries: OrderedDict = OrderedDict()  # path -> (stamp, compiled)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _limits() -> tuple[int, int]:
+        return (
+            getattr(settings, "DOCXGEN_TEMPLATE_CACHE_SIZE", 32),
+            getattr(settings, "DOCXGEN_TEMPLATE_CACHE_MAX_BYTES", 256 * 1024 * 1024),
+        )
+
+    def get(self, template_path):
+        path = Path(template_path).resolve()
+        st = path.stat()
+        key, stamp = str(path), (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # Разбор — вне блокировки: параллельные запросы к другим шаблонам не ждут
+        compiled = self._loader(path)
+        max_entries, max_bytes = self._limits()
+        if max_entries <= 0 or compiled.size > max_bytes:
+            return compiled
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1].size
+            self._entries[key] = (stamp, compiled)
+            self._bytes += compiled.size
+            while len(self._entries) > max_entries or self._bytes > max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+        return compiled
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+template_cache = TemplateCache()
+
+def _set_t_text(t, text: str):
+    """Пишет текст в w:t; '\t' и '\n' внутри значения превращает в w:tab / w:br того же run."""
+    pieces = re.split(r"(\t|\n)", text)
+    t.text = pieces[0]
+    t.set(qn("xml:space"), "preserve")
+    anchor = t
+    for piece in pieces[1:]:
+        if piece == "\t":
+            el = OxmlElement("w:tab")
+        elif piece == "\n":
+            el = OxmlElement("w:br")
+        elif piece:
+            el = OxmlElement("w:t")
+            el.text = piece
+            el.set(qn("xml:space"), "preserve")
+        else:
+            continue
+        anchor.addnext(el)
+        anchor = el
+
+def _replace_in_runs(p, resolve) -> bool:
+    """
+    Замена с сохранением runs: ищет токены в склеенном тексте w:t абзаца,
+    значение пишет в w:t, где токен начинается, а хвост токена вырезает из следующих w:t.
+    Остальные runs (и их форматирование) не трогаются.
+    Возвращает False, если токены не удаётся сопоставить с w:t (например, внутри токена w:tab),
+    — тогда абзац нужно заменить целиком.
+    """
+    nodes = p.xpath("./w:r/w:t | ./w:hyperlink/w:r/w:t")
+    texts = [t.text or "" for t in nodes]
+    joined = "".join(texts)
+    matches = list(TOKEN_RE.finditer(joined))
+    if [m.group(0) for m in matches] != [m.group(0) for m in TOKEN_RE.finditer(p.text or "")]:
+        return False
+
+    starts, offset = [], 0
+    for text in texts:
+        starts.append(offset)
+        offset += len(text)
+
+    # С конца: правки последующих токенов не сдвигают смещения предыдущих
+    for m in reversed(matches):
+        begin, end = m.span()
+        i = bisect_right(starts, begin) - 1
+        while len(texts[i]) <= begin - starts[i]:  # пропускаем пустые w:t на границе
+            i += 1
+        j = bisect_right(starts, end - 1) - 1
+        value = resolve(m)
+        if i == j:
+            texts[i] = texts[i][:begin - starts[i]] + value + texts[i][end - starts[i]:]
+        else:
+            texts[i] = texts[i][:begin - starts[i]] + value
+            for k in range(i + 1, j):
+                texts[k] = ""
+            texts[j] = texts[j][end - starts[j]:]
+
+    for t, text in zip(nodes, texts):
+        if text != (t.text or ""):
+            _set_t_text(t, text)
+    return True
+
+def _replace_in_paragraphs(paragraphs, values_norm: dict[str, str], default_placeholder: str):
+    """
+    Один проход TOKEN_RE по тексту абзаца (w:p): каждый '{...}' разрешается через нормализованный словарь.
+    Абзацы без совпадений не трогаем; в остальных правим только runs, где лежат токены.
+    """
+    keys: dict[str, str] = {}  # '{ Ф И О }' -> 'фио', чтобы не нормализовать один токен дважды
+
+    def resolve(m: re.Match) -> str:
+        token = m.group(0)
+        key = keys.get(token)
+        if key is None:
+            key = keys[token] = _norm(m.group(1))
+        if key[:1] in _BLOCK_SIGILS:
+            return token  # маркер блока без пары — остаётся как есть
+        return values_norm.get(key, default_placeholder)
+
     for p in paragraphs:
         text = p.text or ""
-        if not text:
+        if "{" not in text:
             continue
-        for token, value in mapping_exact.items():
-            if token in text:
-                text = text.replace(token, value)
-        p.text = text  # да, это пересоздаёт runs — зато надёжно заменяет даже «разбитые» плейсхолдеры
+        new_text = TOKEN_RE.sub(resolve, text)
+        if new_text != text and not _replace_in_runs(p, resolve):
+            # Токен не укладывается в w:t — пересобираем абзац одним run (форматирование runs теряется)
+            Paragraph(p, None).text = new_text
+
+def _fill_paragraphs(paragraphs, values_dict: dict[str, str], default_placeholder: str):
+    # Нормализуем словарь значений для кейс-/пробел-инвариантного поиска
+    values_norm = { _norm(k): _as_text(v) for k, v in (values_dict or {}).items() }
+    _replace_in_paragraphs(paragraphs, values_norm, default_placeholder)
 
-def _replace_in_tables(tables, mapping_exact: dict[str, str]):
-    for table in tables:
-        for row in table.rows:
-            for cell in row.cells:
-                _replace_in_paragraphs(cell.paragraphs, mapping_exact)
+def render_document(compiled: CompiledTemplate, values_dict: dict[str, str], default_placeholder: str = "—"):
+    """Клонирует прототип, подставляет значения только в заранее найденные абзацы и разворачивает блоки."""
+    from .blocks import expand_blocks
+
+    with span("clone"):
+        doc = copy.deepcopy(compiled.document)
+    with span("replace"):
+        parts = {str(part.partname): part for part in _story_parts(doc)}
+        # Сначала находим все абзацы и якоря по путям, потом меняем: замены не сдвигают координаты
+        paragraphs = [_resolve_path(parts[partname].element, path) for partname, path, _ in compiled.slots]
+        anchors = [(_resolve_path(parts[partname].element, path), block) for partname, path, block in compiled.blocks]
+        _fill_paragraphs(paragraphs, values_dict, default_placeholder)
+        expand_blocks(anchors, values_dict, default_placeholder, count(compiled.first_id))
+    return doc
+
+def _render_to(template_path, values_dict: dict[str, str], out, default_placeholder: str):
+    """Пишет готовый .docx в бинарный поток out движком из DOCXGEN_RENDER_ENGINE."""
+    started = time.perf_counter()
+    engine = getattr(settings, "DOCXGEN_RENDER_ENGINE", "docx")
+    if engine == "xml":
+        from .xml_engine import render_xml, xml_template_cache
+
+        with span("template_load"):
+            compiled = xml_template_cache.get(template_path)
+        render_xml(compiled, values_dict, out, default_placeholder)
+    else:
+        with span("template_load"):
+            compiled = template_cache.get(template_path)
+        doc = render_document(compiled, values_dict, default_placeholder)
+        with span("save"):
+            doc.save(out)
+    render_seconds.observe(time.perf_counter() - started, template=Path(template_path).name, engine=engine)
 
 def generate_document(template_path: str, values_dict: dict[str, str], default_placeholder: str = "—") -> Path:
     """
@@ -48,48 +365,27 @@ def generate_document(template_path: str, values_dict: dict[str, str], default_p
     — Поддерживает кириллицу, пробелы и произвольный регистр внутри { }.
     — Если значение не найдено, подставляет default_placeholder ('—').
     — Заменяет в тексте, таблицах, header/footer.
-    Возвращает путь к сохранённому файлу в MEDIA_ROOT/generated/<uuid>.docx.
-    """
-    doc = Document(template_path)
-
-    # 1) Собираем все ТЕКСТОВЫЕ ТОКЕНЫ вида '{...}' из документа
-    tokens: set[str] = set()
-    tokens |= _collect_tokens_from_paragraphs(doc.paragraphs)
-    tokens |= _collect_tokens_from_tables(doc.tables)
-
-    # Также пройдёмся по шапкам и подвалам
-    for section in doc.sections:
-        hdr, ftr = section.header, section.footer
-        tokens |= _collect_tokens_from_paragraphs(hdr.paragraphs)
-        tokens |= _collect_tokens_from_tables(hdr.tables)
-        tokens |= _collect_tokens_from_paragraphs(ftr.paragraphs)
-        tokens |= _collect_tokens_from_tables(ftr.tables)
-
-    # 2) Нормализуем словарь значений для кейс-/пробел-инвариантного поиска
-    values_norm = { _norm(k): str(v) for k, v in (values_dict or {}).items() }
-
-    # 3) Готовим точные замены: '{оригинал_из_дока}' -> 'значение'
-    mapping_exact: dict[str, str] = {}
-    for token in tokens:
-        inner = token[1:-1]  # содержимое без скобок
-        key_norm = _norm(inner)
-        value = values_norm.get(key_norm, default_placeholder)
-        mapping_exact[token] = value
-
-    # 4) Применяем замены
-    _replace_in_paragraphs(doc.paragraphs, mapping_exact)
-    _replace_in_tables(doc.tables, mapping_exact)
-
-    for section in doc.sections:
-        hdr, ftr = section.header, section.footer
-        _replace_in_paragraphs(hdr.paragraphs, mapping_exact)
-        _replace_in_tables(hdr.tables, mapping_exact)
-        _replace_in_paragraphs(ftr.paragraphs, mapping_exact)
-        _replace_in_tables(ftr.tables, mapping_exact)
-
-    # 5) Сохраняем
-    out_dir = Path(settings.MEDIA_ROOT) / "generated"
-    out_dir.mkdir(parents=True, exist_ok=True)
-    out_path = out_dir / f"{uuid.uuid4().hex}.docx"
-    doc.save(out_path)
+    — Блоки {#KEY}...{/KEY} и {^KEY}...{/KEY} повторяются по списку или удаляются (core.blocks).
+    — Разобранный шаблон берётся из кэша: повторный рендер не перечитывает .docx.
+    — Движок выбирается настройкой DOCXGEN_RENDER_ENGINE: "docx" (python-docx) или "xml"
+      (core.xml_engine — переписывает только части с плейсхолдерами).
+    Возвращает путь к сохранённому файлу MEDIA_ROOT/generated/.../<uuid>.docx (раскладка — core.storage).
+    """
+    out_path = new_generated_path()
+    with open(out_path, "wb") as out:
+        _render_to(template_path, values_dict, out, default_placeholder)
     return out_path
+
+def render_to_buffer(template_path: str, values_dict: dict[str, str], default_placeholder: str = "—"):
+    """
+    Как generate_document, но без файла в MEDIA_ROOT: результат в SpooledTemporaryFile,
+    который до DOCXGEN_EPHEMERAL_SPOOL_BYTES живёт в памяти. Поток перемотан в начало.
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=getattr(settings, "DOCXGEN_EPHEMERAL_SPOOL_BYTES", 8 * 1024 * 1024))
+    try:
+        _render_to(template_path, values_dict, buffer, default_placeholder)
+    except Exception:
+        buffer.close()
+        raise
+    buffer.seek(0)
+    return buffer
@@ -1,20 +1,37 @@
-from pathlib import Path
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.shortcuts import render, redirect, get_object_or_404
-from django.http import FileResponse, Http404
+from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib import messages
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
+from rest_framework.authentication import CSRFCheck
 from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
-from .models import Entity, Client, Template, GeneratedDocument
+from .models import Entity, Client, Template, GeneratedDocument, GenerationJob
 from .serializers import (
     EntitySerializer, ClientSerializer, ValueSerializer,
-    TemplateSerializer, GeneratedDocumentSerializer
+    TemplateSerializer, GeneratedDocumentSerializer, BatchGenerateSerializer,
+    GenerationJobSerializer, MergeGenerateSerializer, requested_fields,
 )
 from .forms import TemplateUploadForm, GenerateForm, ClientAttributesForm, ClientForm, EntityForm
-from .utils import generate_document
+from . import metrics, render_pool
+from .archive import named_entries, zip_response
+from .downloads import buffer_response, download_response
+from .importer import FORMATS, detect_format, import_clients
+from .merge import merge_response
+from .services import generate_batch, generate_for_client, index_template, render_ephemeral
+from .storage import media_path
+from .preview import preview as render_preview
+from .utils import _norm, template_cache
 
 # ---------- HTML Views ----------
 def entity_edit(request, pk: int):
@@ -79,11 +96,21 @@ def entity_create(request):
 
 # --- Clients UI ---
 
+CLIENTS_PER_PAGE = 50
+
 def client_list(request):
-    total_entities = Entity.objects.count()
+    """Постраничный список; поиск — по началу имени через индекс search_name (без учёта регистра)."""
+    query = request.GET.get("q", "").strip()
+    clients = Client.objects.only("id", "name", "filled_count").order_by("name", "id")
+    if query:
+        prefix = Client.normalize_search(query)
+        clients = clients.filter(search_name__gte=prefix, search_name__lt=prefix + "\U0010ffff")
+    page = Paginator(clients, CLIENTS_PER_PAGE).get_page(request.GET.get("page"))
     return render(request, "client_list.html", {
-        "clients": Client.objects.all().order_by("name"),
-        "total_entities": total_entities,
+        "clients": page.object_list,
+        "page": page,
+        "query": query,
+        "total_entities": Entity.objects.count(),
     })
 
 def client_create(request):
@@ -118,14 +145,7 @@ def generate_view(request):
     if request.method == "POST":
         form = GenerateForm(request.POST)
         if form.is_valid():
-            client = form.cleaned_data["client"]
-            template = form.cleaned_data["template"]
-            values = dict(client.attributes or {})
-            out_path = generate_document(template.file.path, values)
-            rel = Path(out_path).resolve().relative_to(Path(settings.MEDIA_ROOT).resolve())
-            gd = GeneratedDocument.objects.create(client=client, template=template)
-            gd.file.name = rel.as_posix()
-            gd.save()
+            generate_for_client(form.cleaned_data["client"], form.cleaned_data["template"])
             messages.success(request, "Документ сгенерирован!")
             return redirect("generated_list")
     else:
@@ -138,10 +158,8 @@ def generated_list(request):
 
 
 def download_document(request, pk: int):
-    doc = get_object_or_404(GeneratedDocument, pk=pk)
-    if not doc.file:
-        raise Http404("Файл не найден")
-    return FileResponse(open(doc.file.path, "rb"), as_attachment=True, filename=f"{doc.client.name}.docx")
+    doc = get_object_or_404(GeneratedDocument.objects.select_related("client"), pk=pk)
+    return download_response(doc.file.name, f"{doc.client.name}.docx")
 
 # ---------- REST API ----------
 
@@ -153,6 +171,13 @@ class ClientViewSet(viewsets.ModelViewSet):
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
 
+    def get_queryset(self):
+        qs = super().get_queryset()
+        wanted = requested_fields(self.request)
+        if wanted is not None and "attributes" not in wanted:
+            qs = qs.defer("attributes")  # тяжёлый JSON не читаем из БД, если его не просили
+        return qs
+
     @action(detail=True, methods=["get", "put"], url_path="attributes")
     def attributes(self, request, pk=None):
         client = self.get_object()
@@ -164,30 +189,274 @@ class ClientViewSet(viewsets.ModelViewSet):
         client.save(update_fields=["attributes"])
         return Response(client.attributes)
 
+    @action(detail=False, methods=["post"], url_path="import")
+    def import_(self, request):
+        """
+        Массовый импорт (multipart): file=<.csv|.jsonl>, format=csv|jsonl (если не ясно из имени),
+        replace=1 — заменить атрибуты целиком вместо дописывания. Подробности — core/importer.py.
+        """
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise ValidationError({"file": "Нужен файл CSV или JSONL"})
+        fmt = request.data.get("format") or detect_format(upload.name)
+        if fmt not in FORMATS:
+            raise ValidationError({"format": f"Укажите формат: {', '.join(FORMATS)}"})
+        replace = str(request.data.get("replace", "")).lower() in ("1", "true", "yes")
+        try:
+            report = import_clients(upload, fmt, replace=replace)
+        except ValueError as exc:
+            raise ValidationError({"file": str(exc)})
+        return Response(report.as_dict())
+
 class TemplateViewSet(viewsets.ModelViewSet):
-    queryset = Template.objects.all()
+    """?placeholder=<KEY> — только шаблоны, где встречается этот плейсхолдер."""
+    queryset = Template.objects.prefetch_related("placeholders")
     serializer_class = TemplateSerializer
+    cursor_ordering = "-id"
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        key = self.request.query_params.get("placeholder")
+        if key:
+            qs = qs.filter(placeholders__key=_norm(key))
+        return qs
+
+    # Строка и индекс — в одной транзакции: неразобранный шаблон не остаётся в БД без индекса
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            index_template(serializer.save())
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            index_template(serializer.save())
+
+    @action(detail=True, methods=["get"], url_path="missing")
+    def missing(self, request, pk=None):
+        """Клиенты, у которых не заполнен хотя бы один плейсхолдер шаблона: [{id, name, missing: [...]}]."""
+        template = self.get_object()
+        keys = {p.key for p in template.placeholders.all()}
+        attr_keys = {e_key: _norm(e_key) for e_key in Entity.objects.values_list("key", flat=True)}
+        attr_keys = {k: norm for k, norm in attr_keys.items() if norm in keys}
+        unknown = sorted(keys - set(attr_keys.values()))  # таких атрибутов нет ни у одного клиента
+
+        clients = Client.objects.all()
+        if not unknown:
+            if not attr_keys:
+                return Response([])
+            missing_q = Q()
+            for k in attr_keys:
+                missing_q |= ~Q(attributes__has_key=k) | Q(**{f"attributes__{k}": ""})
+            clients = clients.filter(missing_q)
+
+        result = []
+        for client in clients.order_by("name").only("id", "name", "attributes").iterator(chunk_size=500):
+            attrs = client.attributes or {}
+            missing = sorted({norm for k, norm in attr_keys.items() if not attrs.get(k)} | set(unknown))
+            if missing:
+                result.append({"id": client.pk, "name": client.name, "missing": missing})
+        return Response(result)
+
+    @action(detail=True, methods=["get"], url_path="preview")
+    def preview(self, request, pk=None):
+        """
+        Текст шаблона с подставленными значениями, без сборки .docx:
+        ?client=<id>&client=<id>... (или ?clients=1,2,3), ?html=1 — HTML-фрагмент вместо текста.
+        Ответ: [{id, name, text|html, missing: [...]}] — missing подставятся как "—".
+        """
+        template = self.get_object()
+        raw_ids = request.query_params.getlist("client") + request.query_params.get("clients", "").split(",")
+        try:
+            ids = list(dict.fromkeys(int(x) for x in raw_ids if x.strip()))
+        except ValueError:
+            raise ValidationError({"client": "Ожидаются числовые id"})
+        if not ids:
+            raise ValidationError({"client": "Укажите хотя бы одного клиента"})
+        if len(ids) > settings.DOCXGEN_BATCH_MAX_CLIENTS:
+            raise ValidationError({"client": f"Не больше {settings.DOCXGEN_BATCH_MAX_CLIENTS} клиентов за запрос"})
+
+        compiled = template_cache.get(template.file.path)
+        html = request.query_params.get("html") == "1"
+        field = "html" if html else "text"
+        clients = Client.objects.filter(pk__in=ids).only("id", "name", "attributes").in_bulk()
+        result = []
+        for client_id in ids:
+            client = clients.get(client_id)
+            if client is None:
+                continue
+            content, missing = render_preview(compiled, client.attributes, html=html)
+            result.append({"id": client.pk, "name": client.name, field: content, "missing": missing})
+        return Response(result)
 
 class GeneratedDocumentViewSet(viewsets.ReadOnlyModelViewSet):
+    """Фильтры (список и архив): ?client=<id>&template=<id>&created_from=YYYY-MM-DD&created_to=YYYY-MM-DD"""
     queryset = GeneratedDocument.objects.select_related("client", "template").all()
     serializer_class = GeneratedDocumentSerializer
+    cursor_ordering = "-id"
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        params = self.request.query_params
+        for name in ("client", "template"):
+            if params.get(name):
+                if not params[name].isdigit():
+                    raise ValidationError({name: "Ожидается числовой ID"})
+                qs = qs.filter(**{f"{name}_id": int(params[name])})
+        for name, lookup in (("created_from", "created_at__date__gte"), ("created_to", "created_at__date__lte")):
+            if params.get(name):
+                day = parse_date(params[name])
+                if day is None:
+                    raise ValidationError({name: "Ожидается дата YYYY-MM-DD"})
+                qs = qs.filter(**{lookup: day})
+        return qs
+
+    @action(detail=False, methods=["get"], url_path="archive")
+    def archive(self, request):
+        """ZIP всех документов под фильтром; собирается на лету, файлы не читаются в память целиком."""
+        rows = self.get_queryset().exclude(file="").order_by("pk").values_list("client__name", "file")
+        entries = named_entries(
+            (client_name, media_path(file_name)) for client_name, file_name in rows.iterator(chunk_size=500)
+        )
+        return zip_response(entries, filename="documents.zip")
 
     @action(detail=True, methods=["get"], url_path="download")
     def download(self, request, pk=None):
         doc = self.get_object()
-        return FileResponse(open(doc.file.path, "rb"), as_attachment=True, filename=f"{doc.client.name}.docx")
+        return download_response(doc.file.name, f"{doc.client.name}.docx")
+
+class GenerationJobViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                           mixins.ListModelMixin, viewsets.GenericViewSet):
+    """Фоновая генерация: POST ставит задание в очередь, GET — статус, /result/ — готовые файлы."""
+    queryset = GenerationJob.objects.select_related("template").prefetch_related("documents")
+    serializer_class = GenerationJobSerializer
+    cursor_ordering = "-id"
+
+    def create(self, request, *args, **kwargs):
+        serializer = BatchGenerateSerializer(
+            data=request.data, context={"max_clients": settings.DOCXGEN_JOB_MAX_CLIENTS},
+        )
+        serializer.is_valid(raise_exception=True)
+        client_ids = list(serializer.validated_data["clients"].values_list("pk", flat=True))
+        job = GenerationJob.objects.create(
+            template=serializer.validated_data["template"], client_ids=client_ids, total=len(client_ids),
+        )
+        return Response(GenerationJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
-@api_view(["POST"])  # /api/generate/<client_id>/<template_id>/
+    @action(detail=True, methods=["get"], url_path="result")
+    def result(self, request, pk=None):
+        job = self.get_object()
+        if job.status != GenerationJob.Status.DONE:
+            return Response(
+                {"detail": "Задание ещё не завершено", "status": job.status},
+                status=status.HTTP_409_CONFLICT,
+            )
+        docs = list(job.documents.select_related("client").order_by("pk"))
+        if len(docs) == 1:
+            return download_response(docs[0].file.name, f"{docs[0].client.name}.docx")
+        return zip_response(named_entries((d.client.name, d.file.path) for d in docs), filename=f"job-{job.pk}.zip")
+
+def metrics_view(request):
+    """Метрики процесса в формате Prometheus (core.metrics); доступ снаружи закрывает nginx."""
+    if not getattr(settings, "DOCXGEN_METRICS", True):
+        raise Http404
+    return HttpResponse(metrics.exposition(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@api_view(["POST"])  # /api/generate/<client_id>/<template_id>/  ?async=1 | ?download=1 | ?ephemeral=1
 def api_generate(request, client_id: int, template_id: int):
     client = get_object_or_404(Client, pk=client_id)
     template = get_object_or_404(Template, pk=template_id)
-    values = dict(client.attributes or {})
-    out_path = generate_document(template.file.path, values)
-    rel = Path(out_path).resolve().relative_to(Path(settings.MEDIA_ROOT).resolve())
-    gd = GeneratedDocument.objects.create(client=client, template=template)
-    gd.file.name = rel.as_posix()
-    gd.save()
+    if request.query_params.get("async") == "1":
+        job = GenerationJob.objects.create(template=template, client_ids=[client.pk], total=1)
+        return Response(GenerationJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+    if request.query_params.get("ephemeral") == "1":
+        # Разовый просмотр: документ рендерится в память и сразу отдаётся, в БД и на диске ничего не остаётся
+        return buffer_response(render_ephemeral(client, template), f"{client.name}.docx")
+    gd = generate_for_client(client, template)
     if request.query_params.get("download") == "1":
-        return FileResponse(open(gd.file.path, "rb"), as_attachment=True, filename=f"{client.name}.docx")
+        return download_response(gd.file.name, f"{client.name}.docx")
     serializer = GeneratedDocumentSerializer(gd)
-    return Response(serializer.data, status=status.HTTP_201_CREATED)
\ No newline at end of file
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+@api_view(["POST"])  # /api/generate/batch/  {"template": 1, "client_ids": [...], "client_name": "..."}
+def api_generate_batch(request):
+    serializer = BatchGenerateSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    template = serializer.validated_data["template"]
+    docs = generate_batch(template, list(serializer.validated_data["clients"]))
+    if request.query_params.get("download") == "1":
+        return zip_response(named_entries((d.client.name, d.file.path) for d in docs), filename=f"{template.name}.zip")
+    return Response(GeneratedDocumentSerializer(docs, many=True).data, status=status.HTTP_201_CREATED)
+
+@api_view(["POST"])  # /api/generate/merge/  {"template": 1, "client_ids": [...], "client_name": "...", "values": {...}}
+def api_generate_merge(request):
+    """Все клиенты в одном .docx (core.merge): отдаётся потоком, без файлов в MEDIA_ROOT и строк GeneratedDocument."""
+    serializer = MergeGenerateSerializer(
+        data=request.data, context={"max_clients": settings.DOCXGEN_MERGE_MAX_CLIENTS},
+    )
+    serializer.is_valid(raise_exception=True)
+    template = serializer.validated_data["template"]
+    attributes = serializer.validated_data["clients"].values_list("attributes", flat=True).iterator(chunk_size=500)
+    return merge_response(template.file.path, attributes, f"{template.name}.docx",
+                          shared_values=serializer.validated_data["values"])
+
+# ---------- Async API (ASGI) ----------
+# Тяжёлая часть (рендер, ORM) уходит в ограниченный пул core.render_pool, event loop не блокируется.
+# Смысл — только под ASGI (GUNICORN_ASGI=1, см. entrypoint.sh): под WSGI Django выполняет эти view
+# через async_to_sync, а потоковый ответ вычитывает в память целиком.
+# Не путать с ?async=1 у api_generate: там задание ставится в очередь GenerationJob.
+
+async def _csrf_failure(request):
+    """
+    CSRF — как у DRF-view (SessionAuthentication): проверяется, только если пользователь вошёл
+    по сессии; запросы без сессии (скрипты, curl) токен не передают. None — проверка пройдена.
+    """
+    if not (await request.auser()).is_authenticated:
+        return None
+    check = CSRFCheck(lambda req: None)
+    check.process_request(request)
+    reason = check.process_view(request, None, (), {})
+    if reason:
+        return JsonResponse({"detail": f"CSRF Failed: {reason}"}, status=status.HTTP_403_FORBIDDEN)
+    return None
+
+def _saturated_response(exc: render_pool.Saturated):
+    return JsonResponse(
+        {"detail": str(exc)}, status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+def _generate_response(client_id: int, template_id: int, mode: str):
+    client = get_object_or_404(Client, pk=client_id)
+    template = get_object_or_404(Template, pk=template_id)
+    if mode == "ephemeral":
+        return buffer_response(render_ephemeral(client, template), f"{client.name}.docx", asynchronous=True)
+    gd = generate_for_client(client, template)
+    if mode == "download":
+        return download_response(gd.file.name, f"{client.name}.docx", asynchronous=True)
+    return JsonResponse(GeneratedDocumentSerializer(gd).data, status=status.HTTP_201_CREATED)
+
+@csrf_exempt
+@require_POST
+async def api_generate_async(request, client_id: int, template_id: int):
+    """/api/async/generate/<client_id>/<template_id>/  ?download=1 | ?ephemeral=1; при перегрузке — 429."""
+    # csrf_exempt снимает проверку middleware для всех; для сессий она выполняется здесь
+    failure = await _csrf_failure(request)
+    if failure is not None:
+        return failure
+    if request.GET.get("ephemeral") == "1":
+        mode = "ephemeral"
+    elif request.GET.get("download") == "1":
+        mode = "download"
+    else:
+        mode = ""
+    try:
+        return await render_pool.submit(_generate_response, client_id, template_id, mode)
+    except render_pool.Saturated as exc:
+        return _saturated_response(exc)
+
+@require_GET
+async def download_document_async(request, pk: int):
+    """/api/async/generated/<pk>/download/ — то же, что download, без занятого потока на время запроса."""
+    doc = await aget_object_or_404(GeneratedDocument.objects.select_related("client"), pk=pk)
+    return await sync_to_async(download_response, thread_sensitive=False)(
+        doc.file.name, f"{doc.client.name}.docx", asynchronous=True,
+    )
@@ -0,0 +1,249 @@
+"""
+Альтернативный движок рендера: работает с .docx как с zip-архивом, без python-docx Document.
+
+— Разбираются только части с текстом (document.xml, header*.xml, footer*.xml),
+  и только если в них есть плейсхолдеры.
+— Все остальные члены архива (медиа, стили, rels) копируются байт-в-байт,
+  в уже сжатом виде, без распаковки и повторного сжатия.
+— Подстановка значений общая с основным движком (core.utils), поэтому
+  результат можно сверить с generate_document: см. compare_engines().
+"""
+import copy
+import io
+import struct
+import zlib
+import zipfile
+from itertools import count
+from pathlib import Path
+
+from docx import Document
+from docx.opc.constants import CONTENT_TYPE as CT
+from docx.oxml.ns import qn
+from docx.oxml.parser import parse_xml
+from lxml import etree
+
+from .utils import (
+    TemplateCache, render_document, template_cache,
+    _fill_paragraphs, _max_id, _resolve_path, _scan_part, _story_parts,
+)
+from .blocks import compile_blocks, expand_blocks
+from .metrics import span
+
+_CONTENT_TYPES_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+_STORY_CONTENT_TYPES = (CT.WML_DOCUMENT_MAIN, CT.WML_HEADER, CT.WML_FOOTER)
+
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+_END_RECORD = struct.Struct("<4s4H2LH")
+_DATA_DESCRIPTOR = struct.Struct("<4s3L")
+_COPY_CHUNK = 1024 * 1024
+
+
+class XmlTemplate:
+    """
+    Шаблон для XML-движка:
+    — members: ZipInfo всех членов архива (в исходном порядке);
+    — parts: {имя члена: корень XML} — только части, где есть плейсхолдеры;
+    — slots: [(имя члена, path, tokens)], blocks: [(имя члена, path, Block)], first_id — как в CompiledTemplate.
+    """
+    def __init__(self, path: Path, members: list[zipfile.ZipInfo], parts: dict, slots: list, size: int,
+                 blocks: list | None = None, first_id: int = 1):
+        self.path = path
+        self.members = members
+        self.parts = parts
+        self.slots = slots
+        self.size = size
+        self.blocks = blocks or []
+        self.first_id = first_id
+        self.tokens: frozenset[str] = frozenset().union(*(tokens for _, _, tokens in slots))
+
+
+def _story_member_names(zf: zipfile.ZipFile) -> list[str]:
+    """Имена частей с текстом по [Content_Types].xml."""
+    types = etree.fromstring(zf.read("[Content_Types].xml"))
+    return [
+        el.get("PartName").lstrip("/")
+        for el in types.iter(f"{{{_CONTENT_TYPES_NS}}}Override")
+        if el.get("ContentType") in _STORY_CONTENT_TYPES
+    ]
+
+
+def compile_xml_template(template_path) -> XmlTemplate:
+    path = Path(template_path)
+    with span("token_scan"), zipfile.ZipFile(path) as zf:
+        members = zf.infolist()
+        parts, slots, blocks, size, max_id, skipped = {}, [], [], 0, 0, []
+        for name in _story_member_names(zf):
+            data = zf.read(name)
+            if b"{" not in data:
+                skipped.append(name)
+                continue
+            root = parse_xml(data)
+            max_id = max(max_id, _max_id(root))
+            part_blocks = compile_blocks(name, root)
+            part_slots = _scan_part(name, root)
+            if part_slots or part_blocks:
+                parts[name] = root
+                slots += part_slots
+                blocks += part_blocks
+                size += len(data)
+        if blocks:
+            # id в копиях блоков не должны совпасть и с id в частях без плейсхолдеров
+            max_id = max([max_id] + [_max_id(parse_xml(zf.read(name))) for name in skipped])
+    for info in members:
+        if info.flag_bits & 0x1:
+            raise ValueError(f"Зашифрованный член архива не поддерживается: {info.filename}")
+    return XmlTemplate(path, members, parts, slots, size, blocks, max_id + 1)
+
+
+xml_template_cache = TemplateCache(loader=compile_xml_template)
+
+
+class _RawZipWriter:
+    """
+    Минимальный писатель zip: умеет копировать член другого архива как есть
+    (сжатые байты + CRC из исходника) и дописывать новые члены со сжатием deflate — целиком или кусками (open_stream).
+    Пишет строго последовательно, поэтому подходит и для несикаемых потоков.
+    """
+    def __init__(self, fp):
+        self._fp = fp
+        self._offset = 0
+        self._central: list[bytes] = []
+
+    def _write(self, data: bytes):
+        self._fp.write(data)
+        self._offset += len(data)
+
+    def _begin(self, info: zipfile.ZipInfo, method: int, crc: int, csize: int, usize: int,
+               streamed: bool = False) -> tuple:
+        name = info.filename.encode("utf-8")
+        # Бит 3 (data descriptor) — только у потоковых членов: их CRC и размеры известны в конце.
+        # Бит 11 — имя в UTF-8.
+        flags = (info.flag_bits & ~0x8) | 0x800 | (0x8 if streamed else 0)
+        dostime = (info.date_time[3] << 11) | (info.date_time[4] << 5) | (info.date_time[5] // 2)
+        dosdate = ((info.date_time[0] - 1980) << 9) | (info.date_time[1] << 5) | info.date_time[2]
+        self._check(csize, usize)
+        entry = (info, name, flags, method, dostime, dosdate, self._offset)
+        self._write(_LOCAL_HEADER.pack(
+            b"PK\x03\x04", 20, flags, method, dostime, dosdate, crc, csize, usize, len(name), 0,
+        ) + name)
+        return entry
+
+    def _check(self, *sizes: int):
+        if max(self._offset, *sizes) > 0xFFFFFFFF:
+            raise ValueError("Zip64 не поддерживается XML-движком")
+
+    def _end(self, entry: tuple, crc: int, csize: int, usize: int):
+        info, name, flags, method, dostime, dosdate, offset = entry
+        self._central.append(_CENTRAL_HEADER.pack(
+            b"PK\x01\x02", (info.create_system << 8) | 20, 20, flags, method, dostime, dosdate, crc, csize, usize,
+            len(name), 0, 0, 0, 0, info.external_attr, offset,
+        ) + name)
+
+    def copy_raw(self, src, info: zipfile.ZipInfo):
+        """Копирует член из открытого исходного архива без перепаковки."""
+        src.seek(info.header_offset)
+        header = _LOCAL_HEADER.unpack(src.read(_LOCAL_HEADER.size))
+        src.seek(header[-2] + header[-1], io.SEEK_CUR)  # имя + extra локального заголовка
+        entry = self._begin(info, info.compress_type, info.CRC, info.compress_size, info.file_size)
+        remaining = info.compress_size
+        while remaining:
+            chunk = src.read(min(remaining, _COPY_CHUNK))
+            if not chunk:
+                raise ValueError(f"Архив обрезан: {info.filename}")
+            self._write(chunk)
+            remaining -= len(chunk)
+        self._end(entry, info.CRC, info.compress_size, info.file_size)
+
+    def write_bytes(self, info: zipfile.ZipInfo, data: bytes):
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        packed = compressor.compress(data) + compressor.flush()
+        crc = zlib.crc32(data)
+        entry = self._begin(info, zipfile.ZIP_DEFLATED, crc, len(packed), len(data))
+        self._write(packed)
+        self._end(entry, crc, len(packed), len(data))
+
+    def open_stream(self, info: zipfile.ZipInfo) -> "_StreamedMember":
+        """Член, который пишется кусками (размер заранее неизвестен): write(data) ... close()."""
+        return _StreamedMember(self, info)
+
+    def close(self):
+        cd_offset = self._offset
+        for entry in self._central:
+            self._write(entry)
+        count = len(self._central)
+        self._write(_END_RECORD.pack(b"PK\x05\x06", 0, 0, count, count, self._offset - cd_offset, cd_offset, 0))
+
+
+class _StreamedMember:
+    """Член архива со сжатием по мере записи; CRC и размеры уходят в data descriptor после данных."""
+    def __init__(self, writer: _RawZipWriter, info: zipfile.ZipInfo):
+        self._writer = writer
+        self._entry = writer._begin(info, zipfile.ZIP_DEFLATED, 0, 0, 0, streamed=True)
+        self._compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        self._crc = self._csize = self._usize = 0
+
+    def _emit(self, packed: bytes):
+        if packed:
+            self._writer._write(packed)
+            self._csize += len(packed)
+
+    def write(self, data: bytes):
+        self._crc = zlib.crc32(data, self._crc)
+        self._usize += len(data)
+        self._emit(self._compressor.compress(data))
+
+    def close(self):
+        self._emit(self._compressor.flush())
+        self._writer._check(self._csize, self._usize)
+        self._writer._write(_DATA_DESCRIPTOR.pack(b"PK\x07\x08", self._crc, self._csize, self._usize))
+        self._writer._end(self._entry, self._crc, self._csize, self._usize)
+
+
+def _serialize(root) -> bytes:
+    return etree.tostring(root, encoding="UTF-8", standalone=True)
+
+
+def render_xml(compiled: XmlTemplate, values_dict: dict[str, str], out, default_placeholder: str = "—"):
+    """Пишет готовый .docx в бинарный поток out."""
+    with span("clone"):
+        roots = {name: copy.deepcopy(root) for name, root in compiled.parts.items()}
+    with span("replace"):
+        paragraphs = [_resolve_path(roots[name], path) for name, path, _ in compiled.slots]
+        anchors = [(_resolve_path(roots[name], path), block) for name, path, block in compiled.blocks]
+        _fill_paragraphs(paragraphs, values_dict, default_placeholder)
+        expand_blocks(anchors, values_dict, default_placeholder, count(compiled.first_id))
+
+    with span("save"):
+        writer = _RawZipWriter(out)
+        with open(compiled.path, "rb") as src:
+            for info in compiled.members:
+                root = roots.get(info.filename)
+                if root is None:
+                    writer.copy_raw(src, info)
+                else:
+                    writer.write_bytes(info, _serialize(root))
+        writer.close()
+
+
+def _document_texts(source) -> list[str]:
+    doc = Document(source)
+    return [p.text for part in _story_parts(doc) for p in part.element.iter(qn("w:p"))]
+
+
+def compare_engines(template_path, values_dict: dict[str, str], default_placeholder: str = "—") -> list[tuple[int, str, str]]:
+    """
+    Рендерит шаблон обоими движками в память и сравнивает текст всех абзацев.
+    Возвращает список расхождений [(номер абзаца, docx, xml)]; пустой список — результаты совпадают.
+    """
+    docx_buf, xml_buf = io.BytesIO(), io.BytesIO()
+    render_document(template_cache.get(template_path), values_dict, default_placeholder).save(docx_buf)
+    render_xml(xml_template_cache.get(template_path), values_dict, xml_buf, default_placeholder)
+    docx_buf.seek(0)
+    xml_buf.seek(0)
+
+    expected, actual = _document_texts(docx_buf), _document_texts(xml_buf)
+    diffs = [(i, a, b) for i, (a, b) in enumerate(zip(expected, actual)) if a != b]
+    if len(expected) != len(actual):
+        diffs.append((min(len(expected), len(actual)), f"<{len(expected)} абзацев>", f"<{len(actual)} абзацев>"))
+    return diffs
@@ -28,6 +28,13 @@ def env_list(*names: str, default: str = "") -> list[str]:
         raw = default
     return [x.strip() for x in raw.split(",") if x.strip()]
 
+def env_int(*names: str, default: int = 0) -> int:
+    for n in names:
+        v = os.getenv(n)
+        if v:
+            return int(v)
+    return default
+
 def parse_sqlite_url(url_str: str) -> str:
     """Поддержка sqlite:///relative.db и sqlite:////absolute/path.db"""
     u = urlparse(url_str)
@@ -62,6 +69,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -150,6 +158,35 @@ else:
         }
     }
 
+# -------------------------
+# Соединения с БД: несколько воркеров/потоков gunicorn без "database is locked"
+#  — DB_CONN_MAX_AGE: сколько секунд держать соединение между запросами (0 — закрывать сразу);
+#  — SQLite: журнал WAL (читатели не ждут писателя), busy_timeout вместо мгновенной ошибки
+#    блокировки, synchronous=NORMAL (в WAL безопасно); PRAGMA ставит core.signals при подключении,
+#    транзакции открываются как BEGIN IMMEDIATE — блокировка на запись берётся сразу;
+#  — PostgreSQL: DB_POOL=1 — пул psycopg (psycopg[pool]) вместо постоянных соединений.
+# -------------------------
+DB_CONN_MAX_AGE = env_int("DB_CONN_MAX_AGE", default=60)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "wal").lower()
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "normal").lower()
+SQLITE_BUSY_TIMEOUT_MS = env_int("SQLITE_BUSY_TIMEOUT_MS", default=10000)
+DB_POOL = env_bool("DB_POOL", default=False)
+DB_POOL_MIN_SIZE = env_int("DB_POOL_MIN_SIZE", default=2)
+DB_POOL_MAX_SIZE = env_int("DB_POOL_MAX_SIZE", default=10)
+DB_POOL_TIMEOUT = env_int("DB_POOL_TIMEOUT", default=10)
+
+for _db in DATABASES.values():
+    _db["CONN_HEALTH_CHECKS"] = True
+    if _db["ENGINE"] == "django.db.backends.sqlite3":
+        _db["CONN_MAX_AGE"] = DB_CONN_MAX_AGE
+        _db["OPTIONS"] = {"transaction_mode": "IMMEDIATE"}
+    elif DB_POOL:
+        # С пулом Django требует CONN_MAX_AGE = 0: соединения возвращаются в пул после запроса
+        _db["CONN_MAX_AGE"] = 0
+        _db["OPTIONS"] = {"pool": {"min_size": DB_POOL_MIN_SIZE, "max_size": DB_POOL_MAX_SIZE, "timeout": DB_POOL_TIMEOUT}}
+    else:
+        _db["CONN_MAX_AGE"] = DB_CONN_MAX_AGE
+
 # -------------------------
 # Локаль/время
 # -------------------------
@@ -168,8 +205,56 @@ STATIC_ROOT = os.getenv("STATIC_ROOT", str(BASE_DIR / "staticfiles"))
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.getenv("MEDIA_ROOT", str(BASE_DIR / "media"))
 
+# Отдача скачиваний через nginx (X-Accel-Redirect): префикс — internal-локация,
+# смотрящая на MEDIA_ROOT (см. deploy/nginx.conf)
+DOCXGEN_X_ACCEL_REDIRECT = env_bool("DOCXGEN_X_ACCEL_REDIRECT", default=False)
+DOCXGEN_X_ACCEL_PREFIX = os.getenv("DOCXGEN_X_ACCEL_PREFIX", "/protected-media/")
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# -------------------------
+# Генерация документов
+# -------------------------
+# LRU-кэш разобранных шаблонов: число записей и лимит памяти (распакованный размер .docx)
+DOCXGEN_TEMPLATE_CACHE_SIZE = env_int("DOCXGEN_TEMPLATE_CACHE_SIZE", default=32)
+DOCXGEN_TEMPLATE_CACHE_MAX_BYTES = env_int("DOCXGEN_TEMPLATE_CACHE_MAX_MB", default=256) * 1024 * 1024
+# Движок рендера: "docx" (python-docx) или "xml" (потоковая перезапись частей .docx)
+DOCXGEN_RENDER_ENGINE = os.getenv("DOCXGEN_RENDER_ENGINE", "docx").lower()
+# Кэш результатов: одинаковые шаблон + атрибуты клиента не рендерятся повторно
+DOCXGEN_RENDER_CACHE = env_bool("DOCXGEN_RENDER_CACHE", default=True)
+# Максимум клиентов в одном запросе пакетной генерации
+DOCXGEN_BATCH_MAX_CLIENTS = env_int("DOCXGEN_BATCH_MAX_CLIENTS", default=5000)
+# Слияние в один документ (/api/generate/merge/): максимум клиентов; память от их числа не зависит
+DOCXGEN_MERGE_MAX_CLIENTS = env_int("DOCXGEN_MERGE_MAX_CLIENTS", default=20000)
+# Процессов для пакетного рендера (core.parallel); 0/1 — рендер в процессе запроса
+DOCXGEN_RENDER_WORKERS = env_int("DOCXGEN_RENDER_WORKERS", default=0)
+# Async-view под ASGI (core.render_pool): потоков для рендера и сколько задач может ждать сверх них;
+# при полной очереди — 429 с Retry-After
+DOCXGEN_ASYNC_RENDER_THREADS = env_int("DOCXGEN_ASYNC_RENDER_THREADS", default=2)
+DOCXGEN_ASYNC_RENDER_QUEUE = env_int("DOCXGEN_ASYNC_RENDER_QUEUE", default=8)
+# Разовый рендер (?ephemeral=1): до этого размера документ держится в памяти, дальше — во временном файле
+DOCXGEN_EPHEMERAL_SPOOL_BYTES = env_int("DOCXGEN_EPHEMERAL_SPOOL_KB", default=8192) * 1024
+# Фоновые задания (core.jobs): максимум клиентов в задании и через сколько секунд
+# без heartbeat задание «зависшего» воркера возвращается в очередь
+DOCXGEN_JOB_MAX_CLIENTS = env_int("DOCXGEN_JOB_MAX_CLIENTS", default=100000)
+DOCXGEN_JOB_STALE_SECONDS = env_int("DOCXGEN_JOB_STALE_SECONDS", default=600)
+# Раскладка файлов в MEDIA_ROOT (core.storage): "hash" — generated/ab/cd/<имя>,
+# "date" — generated/ГГГГ/ММ/ДД/<имя>, "flat" — все файлы в одном каталоге
+DOCXGEN_STORAGE_LAYOUT = os.getenv("DOCXGEN_STORAGE_LAYOUT", "hash").lower()
+# Хранение сгенерированных файлов (core.retention, команда gc_generated): удалять документы
+# старше N дней и сверх K последних на клиента (0 — без ограничения); воркер заданий
+# запускает сборку мусора раз в DOCXGEN_GC_INTERVAL_SECONDS (0 — не запускает)
+DOCXGEN_RETENTION_DAYS = env_int("DOCXGEN_RETENTION_DAYS", default=0)
+DOCXGEN_RETENTION_PER_CLIENT = env_int("DOCXGEN_RETENTION_PER_CLIENT", default=0)
+DOCXGEN_GC_INTERVAL_SECONDS = env_int("DOCXGEN_GC_INTERVAL_SECONDS", default=0)
+
+# Метрики (/metrics, core.metrics) и выборочное профилирование запросов (core.middleware):
+# доля профилируемых запросов 0..1, профилировщик "cprofile" или "pyinstrument", каталог отчётов
+DOCXGEN_METRICS = env_bool("DOCXGEN_METRICS", default=True)
+DOCXGEN_PROFILE_SAMPLE_RATE = float(os.getenv("DOCXGEN_PROFILE_SAMPLE_RATE") or 0)
+DOCXGEN_PROFILER = os.getenv("DOCXGEN_PROFILER", "cprofile").lower()
+DOCXGEN_PROFILE_DIR = os.getenv("DOCXGEN_PROFILE_DIR", str(BASE_DIR / "profiles"))
+
 # -------------------------
 # DRF
 # -------------------------
@@ -178,6 +263,9 @@ REST_FRAMEWORK = {
         "rest_framework.renderers.JSONRenderer",
         "rest_framework.renderers.BrowsableAPIRenderer",
     ],
+    # Списки отдаются страницами по курсору (?cursor=...&page_size=N), см. core/pagination.py
+    "DEFAULT_PAGINATION_CLASS": "core.pagination.IdCursorPagination",
+    "PAGE_SIZE": env_int("API_PAGE_SIZE", default=100),
 }
 
 # -------------------------
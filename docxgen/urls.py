@@ -2,11 +2,13 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from core.views import metrics_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("core.urls")),            # простые HTML-страницы
     path("api/", include("core.urls_api")),    # REST API
+    path("metrics", metrics_view, name="metrics"),  # Prometheus
 ]
 
 if settings.DEBUG:
@@ -5,6 +5,21 @@ set -e
 python manage.py migrate --noinput
 python manage.py collectstatic --noinput || true
 
-# ВАЖНО: замени "config.wsgi" на модуль твоего проекта, если он называется иначе
-# SQLite любит одиночный воркер — избежим блокировок базы
-exec gunicorn config.wsgi:application --bind 0.0.0.0:8000 --workers 1 --timeout 120
+# Воркеры и потоки gunicorn. С SQLite в режиме WAL (см. «Соединения с БД» в settings)
+# несколько процессов безопасны: писатели ждут друг друга до SQLITE_BUSY_TIMEOUT_MS.
+# GUNICORN_WORKERS=1 GUNICORN_THREADS=1 — прежний режим одного воркера.
+#
+# GUNICORN_ASGI=1 — docxgen.asgi под воркерами uvicorn: async-view (/api/async/...) работают в event loop
+# и отдают файлы потоком. Под WSGI они выполняются через async_to_sync и выигрыша не дают.
+# Синхронные view под ASGI идут в одном потоке на воркер (GUNICORN_THREADS не действует) — воркеров нужно больше.
+if [ "${GUNICORN_ASGI:-0}" = "1" ]; then
+  exec gunicorn docxgen.asgi:application --bind 0.0.0.0:8000 \
+    --worker-class uvicorn_worker.UvicornWorker \
+    --workers "${GUNICORN_WORKERS:-2}" \
+    --timeout "${GUNICORN_TIMEOUT:-120}"
+fi
+
+exec gunicorn docxgen.wsgi:application --bind 0.0.0.0:8000 \
+  --workers "${GUNICORN_WORKERS:-2}" \
+  --threads "${GUNICORN_THREADS:-4}" \
+  --timeout "${GUNICORN_TIMEOUT:-120}"